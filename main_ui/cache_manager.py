@@ -0,0 +1,546 @@
+"""
+    Petals Server Installer - Block weight cache manager
+
+    Author: ParisNeo
+    Version: 1.0.0
+    Description: Shows, pre-stages, verifies and limits the block weights cached on this node.
+
+    Petals servers download the shards holding the weights of the blocks they serve into their cache directory, using
+    the Hugging Face hub layout (models--<org>--<name>/{blobs,refs,snapshots}). This module reads the sharded
+    checkpoint index of a model to know which shards hold which blocks, downloads them ahead of time with
+    huggingface_hub into the same cache so that the server finds them there, checks every download against the hash
+    the hub names its blob after, records that hash to verify them later and keeps the cache under a disk quota by
+    evicting the least recently used models.
+
+    The endpoint defaults to HF_ENDPOINT. huggingface_hub rejects responses without the hub's headers, so a plain file
+    server cannot stand in for the Hugging Face hub: a local stand-in must answer <endpoint>/<model>/resolve/<revision>/
+    <file> with an X-Repo-Commit header and an ETag (plus X-Linked-Etag and X-Linked-Size for LFS files), as the one
+    in tests/test_cache_manager.py does.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from huggingface_hub import hf_hub_download
+from huggingface_hub.utils import EntryNotFoundError
+
+# The same defaults as petals and huggingface_hub
+DEFAULT_CACHE_DIR = Path(os.getenv("PETALS_CACHE", Path.home() / ".cache" / "petals"))
+DEFAULT_ENDPOINT = os.getenv("HF_ENDPOINT", "https://huggingface.co")
+
+INDEX_FILES = ["model.safetensors.index.json", "pytorch_model.bin.index.json"]
+SINGLE_FILES = ["model.safetensors", "pytorch_model.bin"]
+MANIFEST_NAME = "petals_server_installer_cache.json"
+
+# Block weights are named like model.layers.12.mlp.weight (llama), transformer.h.12... (bloom, falcon)
+BLOCK_PATTERN = re.compile(r"(?:^|\.)(?:layers|h|blocks)\.(\d+)\.")
+# Petals announces the blocks it serves as "blocks [3, 4, 5]" or "blocks 3:6"
+SERVED_BLOCKS_PATTERNS = [
+    re.compile(r"blocks \[([\d, ]+)\] are (?:joining|online)"),
+    re.compile(r"blocks (\d+):(\d+)"),
+]
+# The hub names the blob of a file after its etag: the sha256 for LFS files, the git blob sha1 for the others
+SHA256_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+GIT_SHA1_PATTERN = re.compile(r"^[0-9a-f]{40}$")
+
+
+def parse_block_range(text):
+    """
+    Parse a block range typed by the user.
+
+    Args:
+        text (str): Comma separated blocks or ranges, e.g. "0-3, 8". Ranges include both ends.
+
+    Returns:
+        list: The sorted block indices.
+
+    Raises:
+        ValueError: If the text is not a valid block range.
+    """
+    blocks = set()
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            blocks.update(range(int(start), int(end) + 1))
+        else:
+            blocks.add(int(part))
+    return sorted(blocks)
+
+
+def format_block_ranges(blocks):
+    """
+    Format block indices as compact ranges.
+
+    Args:
+        blocks (list): The block indices.
+
+    Returns:
+        str: The ranges, e.g. "0-3, 8", or "none".
+    """
+    blocks = sorted(blocks)
+    if not blocks:
+        return "none"
+    ranges = []
+    start = previous = blocks[0]
+    for block in blocks[1:] + [None]:
+        if block is not None and block == previous + 1:
+            previous = block
+            continue
+        ranges.append(str(start) if start == previous else f"{start}-{previous}")
+        if block is not None:
+            start = previous = block
+    return ", ".join(ranges)
+
+
+def file_hash(path, algorithm):
+    """
+    Hash a file in a single pass.
+
+    Args:
+        path (Path): The file.
+        algorithm (str): "sha256", or "git_sha1" for the hash git gives to a blob with the file's content.
+
+    Returns:
+        str: The hexadecimal hash.
+    """
+    if algorithm == "git_sha1":
+        # Git hashes blobs with a "blob <size>" header
+        digest = hashlib.sha1(f"blob {os.path.getsize(path)}\0".encode())
+    else:
+        digest = hashlib.sha256()
+    with open(path, "rb") as hashed_file:
+        for data in iter(lambda: hashed_file.read(2**20), b""):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def shards_by_block(weight_map):
+    """
+    Group the shard files of a sharded checkpoint by block.
+
+    Args:
+        weight_map (dict): The map from weight names to shard files of the checkpoint index.
+
+    Returns:
+        dict: The set of shard files by block index. Weights outside of the blocks are left out.
+    """
+    shards = {}
+    for weight_name, filename in weight_map.items():
+        match = BLOCK_PATTERN.search(weight_name)
+        if match:
+            shards.setdefault(int(match.group(1)), set()).add(filename)
+    return shards
+
+
+def parse_served_blocks(line):
+    """
+    Find the blocks a petals server announces in a line of its output.
+
+    Args:
+        line (str): The output line.
+
+    Returns:
+        list: The block indices, None if the line does not announce blocks.
+    """
+    match = SERVED_BLOCKS_PATTERNS[0].search(line)
+    if match:
+        return [int(block) for block in match.group(1).split(",") if block.strip()]
+    match = SERVED_BLOCKS_PATTERNS[1].search(line)
+    if match:
+        return list(range(int(match.group(1)), int(match.group(2))))
+    return None
+
+
+class CacheManager:
+    """
+    Manages the block weights cached on this node.
+
+    Attributes:
+        cache_dir (Path): The petals cache directory.
+        quota_bytes (int): The maximum size of the cache in bytes, 0 disables the limit.
+        endpoint (str): The base URL files are downloaded from.
+        token (str): The Hugging Face token for gated models, or None.
+        revision (str): The model revision to download.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, quota_bytes=0, endpoint=DEFAULT_ENDPOINT, token=None, revision="main"):
+        self.cache_dir = Path(cache_dir)
+        self.quota_bytes = quota_bytes
+        self.endpoint = endpoint.rstrip("/")
+        self.token = token
+        self.revision = revision
+        self.lock = threading.RLock()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    # Manifest ==============================================================
+    def load_manifest(self):
+        """
+        Load the manifest holding the hashes, the last use and the served blocks of every model.
+
+        Returns:
+            dict: The manifest, by model name.
+        """
+        path = self.cache_dir / MANIFEST_NAME
+        try:
+            with open(path, "r") as manifest_file:
+                return json.load(manifest_file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def save_manifest(self, manifest):
+        path = self.cache_dir / MANIFEST_NAME
+        temporary_path = path.with_suffix(".tmp")
+        with open(temporary_path, "w") as manifest_file:
+            json.dump(manifest, manifest_file, indent=1)
+        os.replace(temporary_path, path)
+
+    def update_model_entry(self, model_name, update):
+        """
+        Change the manifest entry of a model.
+
+        Args:
+            model_name (str): The model name.
+            update (callable): Called with the entry dictionary, which it modifies in place.
+        """
+        with self.lock:
+            manifest = self.load_manifest()
+            entry = manifest.setdefault(model_name, {"files": {}, "blocks": [], "last_used": 0, "commit": None})
+            update(entry)
+            self.save_manifest(manifest)
+
+    def touch(self, model_name):
+        """
+        Mark a model as just used, so that it is the last one evicted.
+
+        Args:
+            model_name (str): The model name.
+        """
+        self.update_model_entry(model_name, lambda entry: entry.update(last_used=time.time()))
+
+    def remember_blocks(self, model_name, blocks):
+        """
+        Remember the blocks the local server was assigned, they are pre-staged next time.
+
+        Args:
+            model_name (str): The model name.
+            blocks (list): The block indices.
+        """
+        self.update_model_entry(model_name, lambda entry: entry.update(blocks=sorted(blocks), last_used=time.time()))
+
+    def remembered_blocks(self, model_name):
+        """
+        Get the blocks the local server served the last time it ran this model.
+
+        Args:
+            model_name (str): The model name.
+
+        Returns:
+            list: The block indices, empty if the model never ran.
+        """
+        return self.load_manifest().get(model_name, {}).get("blocks", [])
+
+    # Layout ================================================================
+    def model_dir(self, model_name):
+        return self.cache_dir / f"models--{model_name.replace('/', '--')}"
+
+    def snapshot_dir(self, model_name):
+        """
+        Get the snapshot directory files of a model are stored in.
+
+        Args:
+            model_name (str): The model name.
+
+        Returns:
+            Path: The snapshot directory of the cached commit, or of the revision if no commit is known yet.
+        """
+        ref_path = self.model_dir(model_name) / "refs" / self.revision
+        commit = ref_path.read_text().strip() if ref_path.exists() else self.revision
+        return self.model_dir(model_name) / "snapshots" / commit
+
+    # Downloads =============================================================
+    def check_blob(self, path, filename):
+        """
+        Check a downloaded file against the hash its blob is named after, deleting it if it does not match.
+
+        Args:
+            path (Path): The cached file, a link to its blob.
+            filename (str): The file name in the model repository, for the error messages.
+
+        Returns:
+            dict: The hash of the file by algorithm name and its size, as recorded in the manifest.
+
+        Raises:
+            IOError: If the content of the file does not match its hash.
+        """
+        blob = Path(path).resolve()
+        etag = blob.name
+        # Shards weigh gigabytes, they are only hashed with the algorithm the etag tells
+        if SHA256_PATTERN.match(etag):
+            algorithm = "sha256"
+        elif GIT_SHA1_PATTERN.match(etag):
+            algorithm = "git_sha1"
+        else:
+            warnings.warn(f"{filename} cannot be verified, the server gave no hash for it")
+            return {"sha256": file_hash(blob, "sha256"), "size": blob.stat().st_size}
+        if file_hash(blob, algorithm) != etag:
+            blob.unlink()
+            Path(path).unlink()
+            raise IOError(f"Corrupted download of {filename}: hash mismatch")
+        return {algorithm: etag, "size": blob.stat().st_size}
+
+    def download(self, model_name, filename):
+        """
+        Download a file of a model into the cache and check it against its hash.
+
+        Args:
+            model_name (str): The model name.
+            filename (str): The file name in the model repository.
+
+        Returns:
+            Path: The cached file.
+
+        Raises:
+            IOError: If the download is corrupted.
+            EntryNotFoundError: If the model has no such file.
+        """
+        path = Path(hf_hub_download(
+            model_name,
+            filename,
+            cache_dir=self.cache_dir,
+            revision=self.revision,
+            token=self.token,
+            endpoint=self.endpoint,
+        ))
+        info = self.check_blob(path, filename)
+
+        def record(entry):
+            entry["files"][filename] = info
+            entry["commit"] = path.parent.name if path.parent.parent.name == "snapshots" else entry.get("commit")
+        self.update_model_entry(model_name, record)
+        return path
+
+    def get_weight_map(self, model_name):
+        """
+        Get the map from weight names to shard files of a model, downloading its index if needed.
+
+        Args:
+            model_name (str): The model name.
+
+        Returns:
+            dict: The weight map, or None if the checkpoint is a single file.
+
+        Raises:
+            IOError: If the model has neither an index nor a single checkpoint file.
+        """
+        for filename in INDEX_FILES:
+            path = self.snapshot_dir(model_name) / filename
+            if not path.exists():
+                try:
+                    path = self.download(model_name, filename)
+                except EntryNotFoundError:
+                    continue
+            with open(path, "r") as index_file:
+                return json.load(index_file)["weight_map"]
+        return None
+
+    def block_shards(self, model_name):
+        """
+        Find the shard files holding the weights of every block of a model.
+
+        Args:
+            model_name (str): The model name.
+
+        Returns:
+            dict: The set of shard files by block index. For single file checkpoints, the only block is None.
+        """
+        weight_map = self.get_weight_map(model_name)
+        if weight_map is None:
+            for filename in SINGLE_FILES:
+                if (self.snapshot_dir(model_name) / filename).exists():
+                    return {None: {filename}}
+            return {None: {SINGLE_FILES[0]}}
+        return shards_by_block(weight_map)
+
+    def prestage(self, model_name, blocks, progress=None, workers=4):
+        """
+        Download the shards holding the given blocks of a model, skipping those already cached.
+
+        Args:
+            model_name (str): The model name.
+            blocks (list): The block indices.
+            progress (callable): Called with a message after every shard.
+            workers (int): The number of parallel downloads.
+
+        Returns:
+            list: The files that were downloaded.
+        """
+        shards = self.block_shards(model_name)
+        if None in shards:
+            filenames = shards[None]
+        else:
+            filenames = set()
+            for block in blocks:
+                filenames.update(shards.get(block, set()))
+        missing = sorted(filename for filename in filenames if not (self.snapshot_dir(model_name) / filename).exists())
+        self.touch(model_name)
+        # Make room before downloading, the model being staged is never evicted
+        self.enforce_quota(keep=model_name)
+
+        done = []
+        def fetch(filename):
+            self.download(model_name, filename)
+            done.append(filename)
+            if progress is not None:
+                progress(f"{model_name}: {len(done)} / {len(missing)} shards downloaded")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(fetch, missing))
+
+        self.enforce_quota(keep=model_name)
+        return done
+
+    # Inspection ============================================================
+    def cached_blocks(self, model_name):
+        """
+        Find the blocks of a model whose weights are fully cached, without any download.
+
+        Args:
+            model_name (str): The model name.
+
+        Returns:
+            list: The cached block indices.
+        """
+        snapshot = self.snapshot_dir(model_name)
+        for filename in INDEX_FILES:
+            path = snapshot / filename
+            if path.exists():
+                with open(path, "r") as index_file:
+                    weight_map = json.load(index_file)["weight_map"]
+                shards = shards_by_block(weight_map)
+                return sorted(block for block, files in shards.items() if all((snapshot / f).exists() for f in files))
+        return []
+
+    def model_size(self, model_name):
+        """
+        Get the disk usage of a model, counting every stored file once.
+
+        Args:
+            model_name (str): The model name.
+
+        Returns:
+            int: The size in bytes.
+        """
+        total = 0
+        for root, _, files in os.walk(self.model_dir(model_name)):
+            for filename in files:
+                path = os.path.join(root, filename)
+                if not os.path.islink(path):
+                    total += os.path.getsize(path)
+        return total
+
+    def cached_models(self):
+        """
+        List the models present in the cache.
+
+        Returns:
+            list: The model names.
+        """
+        models = []
+        for path in self.cache_dir.glob("models--*"):
+            if path.is_dir():
+                models.append(path.name[len("models--"):].replace("--", "/"))
+        return sorted(models)
+
+    def verify(self, model_name):
+        """
+        Check the cached files of a model against the hashes recorded when they were downloaded.
+
+        Corrupted files are deleted, with their blob, so that they are downloaded again.
+
+        Args:
+            model_name (str): The model name.
+
+        Returns:
+            list: The corrupted files.
+        """
+        corrupted = []
+        files = self.load_manifest().get(model_name, {}).get("files", {})
+        for filename, info in files.items():
+            path = self.snapshot_dir(model_name) / filename
+            if not path.exists():
+                continue
+            algorithm = "git_sha1" if "git_sha1" in info else "sha256"
+            if path.stat().st_size != info["size"] or file_hash(path, algorithm) != info[algorithm]:
+                path.resolve().unlink()
+                path.unlink(missing_ok=True)
+                corrupted.append(filename)
+        def forget(entry):
+            for filename in corrupted:
+                entry["files"].pop(filename, None)
+        if corrupted:
+            self.update_model_entry(model_name, forget)
+        return corrupted
+
+    # Quota =================================================================
+    def enforce_quota(self, keep=None):
+        """
+        Evict the least recently used models until the cache fits in its quota.
+
+        Args:
+            keep (str): A model that must not be evicted, e.g. the one being served.
+
+        Returns:
+            list: The evicted models.
+        """
+        if self.quota_bytes <= 0:
+            return []
+        evicted = []
+        with self.lock:
+            manifest = self.load_manifest()
+            sizes = {model_name: self.model_size(model_name) for model_name in self.cached_models()}
+            usage = sum(sizes.values())
+            candidates = sorted(
+                (model_name for model_name in sizes if model_name != keep),
+                key=lambda model_name: manifest.get(model_name, {}).get("last_used", 0),
+            )
+            for model_name in candidates:
+                if usage <= self.quota_bytes:
+                    break
+                shutil.rmtree(self.model_dir(model_name), ignore_errors=True)
+                usage -= sizes[model_name]
+                if model_name in manifest:
+                    manifest[model_name]["files"] = {}
+                evicted.append(model_name)
+            self.save_manifest(manifest)
+        return evicted
+
+    def describe(self):
+        """
+        Build a human readable summary of the cache.
+
+        Returns:
+            str: A multi-line description of the cached models, their size and cached blocks.
+        """
+        manifest = self.load_manifest()
+        models = self.cached_models()
+        sizes = {model_name: self.model_size(model_name) for model_name in models}
+        quota = f"{self.quota_bytes / 2**30:.1f} GB" if self.quota_bytes > 0 else "unlimited"
+        text = f"Cache directory: {self.cache_dir}\n"
+        text += f"Usage: {sum(sizes.values()) / 2**30:.2f} GB / {quota}\n\n"
+        for model_name in sorted(models, key=lambda name: -manifest.get(name, {}).get("last_used", 0)):
+            entry = manifest.get(model_name, {})
+            last_used = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["last_used"])) if entry.get("last_used") else "unknown"
+            text += f"{model_name}: {sizes[model_name] / 2**30:.2f} GB, last used {last_used}\n"
+            text += f"  cached blocks: {format_block_ranges(self.cached_blocks(model_name))}\n"
+            if entry.get("blocks"):
+                text += f"  last served blocks: {format_block_ranges(entry['blocks'])}\n"
+        return text
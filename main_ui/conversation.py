@@ -0,0 +1,271 @@
+"""
+    Petals Server Installer - Conversation context
+
+    Author: ParisNeo
+    Version: 1.0.0
+    Description: A token-budgeted conversation store for the multi-turn test client.
+
+    Every turn is tokenized once, when it is added, and its token count is kept. Building the next prompt then only
+    tokenizes the new user message, and the oldest turns are dropped whenever the prompt would exceed the context
+    budget. The system prompt is always kept.
+"""
+from collections import deque
+
+# Context length used when neither the configuration nor the model tells us
+DEFAULT_CONTEXT_LENGTH = 2048
+# The smallest prompt budget we keep, max_new_tokens is reduced rather than going below it
+MIN_PROMPT_BUDGET = 64
+
+
+def get_context_length(model, tokenizer, configured_length=0):
+    """
+    Find the maximum sequence length of a model.
+
+    Args:
+        model: The loaded model.
+        tokenizer: The tokenizer matching the model.
+        configured_length (int): A length set by the user, 0 to detect it from the model.
+
+    Returns:
+        int: The maximum number of tokens the model can attend to.
+    """
+    if configured_length > 0:
+        return configured_length
+    config = getattr(model, "config", None)
+    for attribute in ["max_position_embeddings", "max_sequence_length", "seq_length", "n_positions"]:
+        value = getattr(config, attribute, None)
+        if isinstance(value, int) and value > 0:
+            return value
+    # Tokenizers without a known limit report a huge sentinel value
+    value = getattr(tokenizer, "model_max_length", None)
+    if isinstance(value, int) and 0 < value < 1_000_000:
+        return value
+    return DEFAULT_CONTEXT_LENGTH
+
+
+def split_context(context_length, max_new_tokens):
+    """
+    Share the context of a model between the prompt and the generated tokens.
+
+    The prompt gets what max_new_tokens leaves, but at least MIN_PROMPT_BUDGET tokens (or half of a shorter context):
+    when the context is too short for both, max_new_tokens is reduced so that the prompt and the answer still fit.
+
+    Args:
+        context_length (int): The maximum number of tokens the model can attend to.
+        max_new_tokens (int): The number of tokens the user asked to generate.
+
+    Returns:
+        tuple: The (prompt_budget, max_new_tokens) tuple, which never adds up to more than context_length.
+    """
+    prompt_budget = max(context_length - max_new_tokens, min(MIN_PROMPT_BUDGET, context_length // 2))
+    return prompt_budget, min(max_new_tokens, context_length - prompt_budget)
+
+
+class Turn:
+    """
+    A single exchange between the user and the assistant.
+
+    Attributes:
+        user (str): The user message.
+        assistant (str): The assistant response.
+        text (str): The turn rendered with the generation template.
+        tokens (int): The number of tokens of the rendered turn.
+    """
+
+    def __init__(self, user, assistant, text, tokens):
+        self.user = user
+        self.assistant = assistant
+        self.text = text
+        self.tokens = tokens
+
+
+class Conversation:
+    """
+    A multi-turn conversation kept within a token budget.
+
+    The generation template is the one used by the single-shot client, for example
+    "{system_prompt}### User: {message}\\n\\n### Assistant:\\n". The system prompt is rendered once at the start of the
+    prompt, every turn is rendered with an empty system prompt followed by the assistant answer.
+
+    Attributes:
+        tokenizer: The tokenizer used to count tokens.
+        template (str): The generation template with {system_prompt} and {message} placeholders.
+        system_prompt (str): The system prompt, always part of the prompt.
+        budget (int): The maximum number of prompt tokens.
+        turns (deque): The turns that still fit in the budget, oldest first.
+        dropped_turns (int): The number of turns dropped to stay within the budget.
+        truncated_messages (int): The number of user messages that had to be cut to fit on their own.
+    """
+
+    def __init__(self, tokenizer, template, system_prompt, budget):
+        """
+        Initialize a Conversation instance.
+
+        Args:
+            tokenizer: The tokenizer used to count tokens.
+            template (str): The generation template with {system_prompt} and {message} placeholders.
+            system_prompt (str): The system prompt, always part of the prompt.
+            budget (int): The maximum number of prompt tokens.
+        """
+        self.tokenizer = tokenizer
+        self.template = template
+        self.system_prompt = system_prompt
+        self.set_budget(budget)
+        self.turns = deque()
+        self.turn_tokens = 0
+        self.dropped_turns = 0
+        self.truncated_messages = 0
+        # The system prompt and the special tokens the tokenizer adds around the whole prompt
+        self.system_tokens = self.count_tokens(system_prompt) + self.count_special_tokens()
+        self.pending = None
+
+    def set_budget(self, budget):
+        """
+        Change the maximum number of prompt tokens. Turns that no longer fit are dropped with the next prompt.
+
+        Args:
+            budget (int): The maximum number of prompt tokens.
+        """
+        self.budget = max(budget, 0)
+
+    def count_tokens(self, text):
+        """
+        Count the tokens of a piece of text, without special tokens.
+
+        Args:
+            text (str): The text to count.
+
+        Returns:
+            int: The number of tokens.
+        """
+        if not text:
+            return 0
+        return len(self.tokenizer(text, add_special_tokens=False)["input_ids"])
+
+    def count_special_tokens(self):
+        """
+        Count the special tokens the tokenizer adds to a full prompt (e.g. <s>).
+
+        Returns:
+            int: The number of special tokens.
+        """
+        return len(self.tokenizer("", add_special_tokens=True)["input_ids"])
+
+    def render(self, message, answer=""):
+        """
+        Render a turn with the generation template, without the system prompt.
+
+        Args:
+            message (str): The user message.
+            answer (str): The assistant answer, empty for the turn being generated.
+
+        Returns:
+            str: The rendered turn.
+        """
+        return self.template.format(system_prompt="", message=message) + answer
+
+    def prompt_tokens(self):
+        """
+        Get the number of tokens used by the system prompt and the kept turns.
+
+        Returns:
+            int: The number of tokens.
+        """
+        return self.system_tokens + self.turn_tokens
+
+    def build_prompt(self, message):
+        """
+        Build the prompt for a new user message.
+
+        The oldest turns are dropped until the prompt fits in the budget. If the message does not fit even with no
+        history at all, its beginning is cut. The message is remembered so that `add_answer` can store the turn.
+
+        Args:
+            message (str): The new user message.
+
+        Returns:
+            str: The prompt to send to the model.
+
+        Raises:
+            ValueError: If the system prompt and the template leave no room for the message, the history is then kept.
+        """
+        text = self.render(message)
+        tokens = self.count_tokens(text)
+        template_tokens = tokens - self.count_tokens(message)
+        if self.system_tokens + template_tokens >= self.budget:
+            raise ValueError(
+                f"The system prompt and the template take {self.system_tokens + template_tokens} tokens, which leaves no "
+                f"room for the message in the {self.budget} token prompt budget. Shorten the system prompt, lower max "
+                "new tokens or raise the context length."
+            )
+
+        while self.turns and self.prompt_tokens() + tokens > self.budget:
+            turn = self.turns.popleft()
+            self.turn_tokens -= turn.tokens
+            self.dropped_turns += 1
+
+        if self.prompt_tokens() + tokens > self.budget:
+            message = self.truncate(message, self.budget - self.prompt_tokens() - template_tokens)
+            text = self.render(message)
+            tokens = self.count_tokens(text)
+            self.truncated_messages += 1
+
+        self.pending = (message, tokens)
+        history = "".join(turn.text for turn in self.turns)
+        return self.template.format(system_prompt=self.system_prompt + history, message=message)
+
+    def truncate(self, message, max_tokens):
+        """
+        Keep only the last tokens of a message.
+
+        Args:
+            message (str): The message to cut.
+            max_tokens (int): The number of tokens to keep.
+
+        Returns:
+            str: The end of the message.
+        """
+        if max_tokens <= 0:
+            return ""
+        input_ids = self.tokenizer(message, add_special_tokens=False)["input_ids"]
+        return self.tokenizer.decode(input_ids[-max_tokens:], skip_special_tokens=True)
+
+    def add_answer(self, answer):
+        """
+        Store the answer to the message passed to the last `build_prompt` call.
+
+        Args:
+            answer (str): The assistant answer.
+        """
+        if self.pending is None:
+            return
+        message, _ = self.pending
+        self.pending = None
+        text = self.render(message, answer.strip()) + "\n"
+        turn = Turn(message, answer.strip(), text, self.count_tokens(text))
+        self.turns.append(turn)
+        self.turn_tokens += turn.tokens
+
+    def transcript(self):
+        """
+        Build a readable transcript of the kept turns.
+
+        Returns:
+            str: The transcript.
+        """
+        lines = []
+        if self.dropped_turns:
+            lines.append(f"[{self.dropped_turns} earlier turn(s) dropped from the context]\n")
+        for turn in self.turns:
+            lines.append(f"User: {turn.user}\n")
+            lines.append(f"Assistant: {turn.assistant}\n")
+        return "\n".join(lines)
+
+    def describe(self):
+        """
+        Build a one line summary of the context usage.
+
+        Returns:
+            str: The summary.
+        """
+        return f"Context: {self.prompt_tokens()} / {self.budget} tokens, {len(self.turns)} turn(s) kept, {self.dropped_turns} dropped"
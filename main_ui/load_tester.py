@@ -0,0 +1,369 @@
+"""
+    Petals Server Installer - Load tester
+
+    Author: ParisNeo
+    Version: 1.0.0
+    Description: Drives concurrent inference sessions to measure how much traffic a node can serve.
+
+    Sessions are started one after the other over a ramp-up period and each one sends a number of generation
+    requests with prompt and output lengths drawn from configurable ranges. The test reports throughput, latency
+    percentiles, error rates and the resources used by the machine while it ran.
+
+    The requests go through a backend. PetalsBackend uses a distributed petals model, StubBackend only sleeps and
+    lets the load tester be exercised without a swarm.
+"""
+import math
+import random
+import subprocess
+import threading
+import time
+from collections import Counter
+
+import psutil
+
+
+def percentile(values, fraction):
+    """
+    Get a percentile of a list of values using the nearest rank method.
+
+    Args:
+        values (list): The values, in any order.
+        fraction (float): The percentile as a fraction between 0 and 1.
+
+    Returns:
+        float: The percentile, or None if there are no values.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    # The nearest rank is the smallest rank covering the fraction of the values, the rounding only absorbs float
+    # errors such as 0.07 * 100 = 7.000000000000001
+    rank = math.ceil(round(fraction * len(ordered), 9))
+    index = min(len(ordered) - 1, max(0, rank - 1))
+    return ordered[index]
+
+
+class LoadProfile:
+    """
+    The shape of the traffic generated by a load test.
+
+    Attributes:
+        sessions (int): The number of concurrent sessions.
+        requests_per_session (int): The number of requests each session sends one after the other.
+        ramp_up (float): The time in seconds over which the sessions are started.
+        prompt_tokens (tuple): The minimum and maximum prompt length in tokens.
+        new_tokens (tuple): The minimum and maximum number of generated tokens.
+        seed (int): The seed of the random length draws, None for a different draw every run.
+    """
+
+    def __init__(self, sessions=4, requests_per_session=1, ramp_up=0.0, prompt_tokens=(16, 64), new_tokens=(16, 64), seed=None):
+        self.sessions = sessions
+        self.requests_per_session = requests_per_session
+        self.ramp_up = ramp_up
+        self.prompt_tokens = prompt_tokens
+        self.new_tokens = new_tokens
+        self.seed = seed
+
+    def start_offsets(self):
+        """
+        Get the start time of every session relative to the start of the test.
+
+        Returns:
+            list: The offsets in seconds, spread linearly over the ramp-up period.
+        """
+        if self.sessions <= 1:
+            return [0.0] * self.sessions
+        step = self.ramp_up / (self.sessions - 1)
+        return [i * step for i in range(self.sessions)]
+
+
+class StubBackend:
+    """
+    A backend that simulates a model by sleeping, used to test the load tester offline.
+
+    Attributes:
+        prefill_latency (float): The time in seconds to process a prompt token.
+        token_latency (float): The time in seconds to generate a token.
+        error_rate (float): The probability that a request fails.
+    """
+
+    def __init__(self, prefill_latency=0.0005, token_latency=0.005, error_rate=0.0, seed=None):
+        self.prefill_latency = prefill_latency
+        self.token_latency = token_latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def run_session(self, prompt_tokens, new_tokens):
+        """
+        Simulate a generation request.
+
+        Args:
+            prompt_tokens (int): The prompt length in tokens.
+            new_tokens (int): The number of tokens to generate.
+
+        Returns:
+            int: The number of generated tokens.
+        """
+        with self.lock:
+            fail = self.random.random() < self.error_rate
+        time.sleep(prompt_tokens * self.prefill_latency)
+        if fail:
+            raise RuntimeError("Simulated server error")
+        time.sleep(new_tokens * self.token_latency)
+        return new_tokens
+
+
+class PetalsBackend:
+    """
+    A backend that sends generation requests to the swarm through a distributed petals model.
+
+    The prompts are random token ids: the content does not matter for the load, only the lengths do.
+
+    Attributes:
+        model: The distributed model used for generation.
+        tokenizer: The tokenizer matching the model.
+    """
+
+    def __init__(self, model, tokenizer):
+        self.model = model
+        self.tokenizer = tokenizer
+
+    def run_session(self, prompt_tokens, new_tokens):
+        """
+        Send a generation request.
+
+        Args:
+            prompt_tokens (int): The prompt length in tokens.
+            new_tokens (int): The number of tokens to generate.
+
+        Returns:
+            int: The number of generated tokens.
+        """
+        import torch
+
+        special_ids = set(self.tokenizer.all_special_ids)
+        vocab_size = len(self.tokenizer)
+        ids = [token for token in torch.randint(0, vocab_size, (prompt_tokens * 2,)).tolist() if token not in special_ids]
+        inputs = torch.tensor([ids[:prompt_tokens]]).to(self.model.device)
+        outputs = self.model.generate(inputs, max_new_tokens=new_tokens, min_new_tokens=new_tokens)
+        return outputs.shape[1] - inputs.shape[1]
+
+
+class ResourceSampler:
+    """
+    Samples the CPU, memory and GPU usage of the machine in a background thread.
+
+    Attributes:
+        interval (float): The time in seconds between two samples.
+        samples (list): The samples as dictionaries with "cpu", "memory" and, if available, "gpu" percentages.
+    """
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self.samples = []
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def sample(self):
+        """
+        Take a single sample.
+
+        Returns:
+            dict: The CPU, memory and GPU usage in percent.
+        """
+        sample = {"cpu": psutil.cpu_percent(), "memory": psutil.virtual_memory().percent}
+        try:
+            output = subprocess.check_output(
+                ["nvidia-smi", "--query-gpu=utilization.gpu", "--format=csv,noheader,nounits"], universal_newlines=True
+            )
+            values = [float(line) for line in output.split("\n") if line.strip()]
+            if values:
+                sample["gpu"] = max(values)
+        except (OSError, subprocess.CalledProcessError, ValueError):
+            pass
+        return sample
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.samples.append(self.sample())
+
+    def start(self):
+        psutil.cpu_percent()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        if not self.samples:
+            self.samples.append(self.sample())
+
+    def summary(self):
+        """
+        Summarize the samples.
+
+        Returns:
+            dict: For every measured resource, its average and maximum usage in percent.
+        """
+        summary = {}
+        for key in ["cpu", "memory", "gpu"]:
+            values = [sample[key] for sample in self.samples if key in sample]
+            if values:
+                summary[key] = (sum(values) / len(values), max(values))
+        return summary
+
+
+class RequestResult:
+    """
+    The outcome of a single generation request.
+
+    Attributes:
+        session (int): The index of the session that sent the request.
+        start (float): The start time of the request relative to the start of the test.
+        latency (float): The duration of the request in seconds.
+        tokens (int): The number of generated tokens, 0 if the request failed.
+        error (str): The error message, None if the request succeeded.
+    """
+
+    def __init__(self, session, start, latency, tokens, error=None):
+        self.session = session
+        self.start = start
+        self.latency = latency
+        self.tokens = tokens
+        self.error = error
+
+
+class LoadTestReport:
+    """
+    The results of a load test.
+
+    Attributes:
+        results (list): The RequestResult of every request.
+        duration (float): The wall clock duration of the test in seconds.
+        resources (dict): The resource usage summary from the ResourceSampler.
+    """
+
+    def __init__(self, results, duration, resources):
+        self.results = results
+        self.duration = duration
+        self.resources = resources
+
+    def successes(self):
+        return [result for result in self.results if result.error is None]
+
+    def error_rate(self):
+        if not self.results:
+            return 0.0
+        return (len(self.results) - len(self.successes())) / len(self.results)
+
+    def throughput(self):
+        """
+        Get the number of generated tokens per second over the whole test.
+
+        Returns:
+            float: The throughput in tokens per second.
+        """
+        if self.duration <= 0:
+            return 0.0
+        return sum(result.tokens for result in self.results) / self.duration
+
+    def latencies(self):
+        return [result.latency for result in self.successes()]
+
+    def token_latencies(self):
+        return [result.latency / result.tokens for result in self.successes() if result.tokens > 0]
+
+    def describe(self):
+        """
+        Build a human readable report.
+
+        Returns:
+            str: The multi-line report.
+        """
+        def fmt(value, unit="s", scale=1.0):
+            return "n/a" if value is None else f"{value * scale:.3f}{unit}"
+
+        latencies = self.latencies()
+        token_latencies = self.token_latencies()
+        text = f"Requests: {len(self.results)}, succeeded: {len(self.successes())}, error rate: {self.error_rate() * 100:.1f}%\n"
+        text += f"Duration: {self.duration:.2f}s\n"
+        text += f"Throughput: {self.throughput():.2f} tokens/s, {len(self.successes()) / max(self.duration, 1e-9):.2f} requests/s\n"
+        text += "Request latency: " + ", ".join(f"p{int(p * 100)} {fmt(percentile(latencies, p))}" for p in [0.5, 0.9, 0.99]) + "\n"
+        text += "Per token latency: " + ", ".join(
+            f"p{int(p * 100)} {fmt(percentile(token_latencies, p), 'ms', 1000)}" for p in [0.5, 0.9, 0.99]
+        ) + "\n"
+        errors = Counter(result.error for result in self.results if result.error is not None)
+        for error, count in errors.most_common(3):
+            text += f"Error ({count}x): {error}\n"
+        for key, (average, maximum) in self.resources.items():
+            text += f"{key.upper()} usage: average {average:.1f}%, max {maximum:.1f}%\n"
+        return text
+
+
+class LoadTester:
+    """
+    Runs a load test against a backend.
+
+    Attributes:
+        backend: The backend requests are sent through, with a run_session(prompt_tokens, new_tokens) method.
+        profile (LoadProfile): The shape of the generated traffic.
+        sampler (ResourceSampler): The resource sampler running during the test.
+    """
+
+    def __init__(self, backend, profile, sample_interval=1.0):
+        self.backend = backend
+        self.profile = profile
+        self.sampler = ResourceSampler(sample_interval)
+        self.results = []
+        self.lock = threading.Lock()
+
+    def run_session(self, session, offset, lengths, start_time, progress):
+        time.sleep(max(0.0, start_time + offset - time.monotonic()))
+        for prompt_tokens, new_tokens in lengths:
+            request_start = time.monotonic()
+            try:
+                tokens = self.backend.run_session(prompt_tokens, new_tokens)
+                error = None
+            except Exception as e:
+                tokens = 0
+                error = f"{type(e).__name__}: {e}"
+            result = RequestResult(session, request_start - start_time, time.monotonic() - request_start, tokens, error)
+            with self.lock:
+                self.results.append(result)
+                done = len(self.results)
+            if progress is not None:
+                progress(done, self.profile.sessions * self.profile.requests_per_session)
+
+    def run(self, progress=None):
+        """
+        Run the load test and wait for every session to finish.
+
+        Args:
+            progress (callable): Called with the number of finished and total requests after every request.
+
+        Returns:
+            LoadTestReport: The results of the test.
+        """
+        profile = self.profile
+        draw = random.Random(profile.seed)
+        # Lengths are drawn up front so that a seeded profile always produces the same traffic
+        lengths = [
+            [(draw.randint(*profile.prompt_tokens), draw.randint(*profile.new_tokens)) for _ in range(profile.requests_per_session)]
+            for _ in range(profile.sessions)
+        ]
+        self.results = []
+        self.sampler.start()
+        start_time = time.monotonic()
+        threads = [
+            threading.Thread(target=self.run_session, args=(session, offset, lengths[session], start_time, progress), daemon=True)
+            for session, offset in enumerate(profile.start_offsets())
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duration = time.monotonic() - start_time
+        self.sampler.stop()
+        return LoadTestReport(sorted(self.results, key=lambda result: result.start), duration, self.sampler.summary())
@@ -0,0 +1,138 @@
+"""
+    Petals Server Installer - Client local modules
+
+    Author: ParisNeo
+    Version: 1.0.0
+    Description: Places and profiles the parts of a distributed model that run on the client.
+
+    A distributed petals model only runs its transformer blocks on the swarm. The input embeddings, the final norm and
+    the LM head run locally at every generation step, and for large vocabularies the LM head matmul is far from free.
+    This module moves those modules to the chosen device and measures the time they take per step.
+"""
+import threading
+import time
+
+import torch
+
+
+def get_local_modules(model):
+    """
+    Find the modules of a distributed model that run on the client.
+
+    Args:
+        model: The distributed model.
+
+    Returns:
+        dict: The embeddings, final norm and LM head modules by name, missing ones are left out.
+    """
+    modules = {
+        "embeddings": model.get_input_embeddings(),
+        "lm_head": model.get_output_embeddings(),
+    }
+    base_model = getattr(model, "base_model", model)
+    # Bloom and Falcon name the final norm ln_f, Llama names it norm
+    for name in ["ln_f", "norm", "final_layernorm"]:
+        if isinstance(getattr(base_model, name, None), torch.nn.Module):
+            modules["final_norm"] = getattr(base_model, name)
+            break
+    return {name: module for name, module in modules.items() if module is not None}
+
+
+def place_local_modules(model, device):
+    """
+    Move the locally executed modules of a distributed model to a device.
+
+    The remote blocks hold no weights on the client, so moving the model only moves its local modules.
+
+    Args:
+        model: The distributed model.
+        device (str): The device, e.g. "cpu" or "cuda:0".
+
+    Returns:
+        The model, on the device.
+    """
+    return model.to(device)
+
+
+class LocalComputeProfiler:
+    """
+    Measures the time spent in the local modules of a distributed model.
+
+    Used as a context manager around a generation: hooks are registered on entry and removed on exit. On CUDA the
+    device is synchronized around every module call so that the measured time is the compute time, not the launch
+    time. A generation step is counted for every LM head call.
+
+    The model may be shared, e.g. with a load test running at the same time: only the calls made from the thread that
+    entered the profiler are measured.
+
+    Attributes:
+        times (dict): The total time in seconds spent in every local module.
+        steps (int): The number of generation steps.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.modules = get_local_modules(model)
+        self.times = {name: 0.0 for name in self.modules}
+        self.steps = 0
+        self.handles = []
+        self.thread_id = None
+        self.starts = {}
+
+    def synchronize(self, module):
+        for parameter in module.parameters():
+            if parameter.device.type == "cuda":
+                torch.cuda.synchronize(parameter.device)
+            break
+
+    def make_hooks(self, name):
+        def pre_hook(module, inputs):
+            if threading.get_ident() != self.thread_id:
+                return
+            self.synchronize(module)
+            self.starts[name] = time.perf_counter()
+
+        def post_hook(module, inputs, outputs):
+            if threading.get_ident() != self.thread_id:
+                return
+            self.synchronize(module)
+            self.times[name] += time.perf_counter() - self.starts.pop(name, time.perf_counter())
+            if name == "lm_head":
+                self.steps += 1
+
+        return pre_hook, post_hook
+
+    def __enter__(self):
+        self.thread_id = threading.get_ident()
+        for name, module in self.modules.items():
+            pre_hook, post_hook = self.make_hooks(name)
+            self.handles.append(module.register_forward_pre_hook(pre_hook))
+            self.handles.append(module.register_forward_hook(post_hook))
+        return self
+
+    def __exit__(self, *args):
+        for handle in self.handles:
+            handle.remove()
+        self.handles = []
+
+    def per_step_time(self):
+        """
+        Get the average local compute time of a generation step.
+
+        Returns:
+            float: The time in seconds, 0 if no step ran.
+        """
+        if self.steps == 0:
+            return 0.0
+        return sum(self.times.values()) / self.steps
+
+    def describe(self):
+        """
+        Build a one line summary of the local compute time.
+
+        Returns:
+            str: The per step time, in total and per module.
+        """
+        device = next(self.model.parameters()).device
+        details = ", ".join(f"{name} {self.times[name] / max(self.steps, 1) * 1000:.2f}" for name in self.modules)
+        return f"Local compute on {device}: {self.per_step_time() * 1000:.2f} ms/step over {self.steps} steps ({details})"
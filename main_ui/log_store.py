@@ -0,0 +1,346 @@
+"""
+    Petals Server Installer - Server log store
+
+    Author: ParisNeo
+    Version: 1.0.0
+    Description: A rotating, compressed on-disk store of the server output with an indexed search.
+
+    Lines are buffered by a background thread and written in chunks. Every chunk is an independent gzip member
+    appended to the current segment file, so a segment is a valid .gz file and any chunk can be decompressed on its
+    own. For every chunk, a fixed size record (first timestamp, last timestamp, segment, offset, length) is appended
+    to an index file. A time-range query bisects the memory-mapped index and only decompresses the chunks that overlap
+    the range, read from memory-mapped segments. When a segment grows past its size limit a new one is started, and
+    the oldest segments are deleted once there are too many of them.
+"""
+import gzip
+import mmap
+import os
+import queue
+import re
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+
+# first timestamp, last timestamp, segment id, offset, length
+INDEX_RECORD = struct.Struct("<ddIQI")
+
+# Formats accepted for the start and end of a time-range query
+TIME_FORMATS = ["%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d", "%H:%M:%S", "%H:%M"]
+
+
+def parse_time(text):
+    """
+    Parse a date and time typed by the user.
+
+    A time without a date refers to today.
+
+    Args:
+        text (str): The date and time, e.g. "2023-09-21 14:05", or an empty string.
+
+    Returns:
+        float: The time as a Unix timestamp, None if the text is empty.
+
+    Raises:
+        ValueError: If the text matches none of the accepted formats.
+    """
+    text = text.strip()
+    if not text:
+        return None
+    for time_format in TIME_FORMATS:
+        try:
+            parsed = datetime.strptime(text, time_format)
+        except ValueError:
+            continue
+        if "%Y" not in time_format:
+            today = datetime.now()
+            parsed = parsed.replace(year=today.year, month=today.month, day=today.day)
+        return parsed.timestamp()
+    raise ValueError(f"Unrecognized time {text!r}, expected YYYY-MM-DD HH:MM[:SS]")
+
+
+def format_time(timestamp):
+    """
+    Format a timestamp for display.
+
+    Args:
+        timestamp (float): The Unix timestamp.
+
+    Returns:
+        str: The local date and time with milliseconds.
+    """
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+
+class LogStore:
+    """
+    Stores server output lines on disk and searches them.
+
+    Appending never blocks: lines are timestamped and queued, and a background thread compresses and writes them.
+
+    Attributes:
+        directory (Path): The directory holding the segments and the index.
+        max_segment_bytes (int): The compressed size after which a new segment is started.
+        max_segments (int): The number of segments kept on disk.
+        chunk_bytes (int): The amount of buffered text that triggers a write.
+        flush_interval (float): The maximum time in seconds a line stays buffered.
+    """
+
+    def __init__(self, directory, max_segment_bytes=64 * 2**20, max_segments=50, chunk_bytes=64 * 2**10, flush_interval=1.0):
+        """
+        Initialize a LogStore instance and start its writer thread.
+
+        Args:
+            directory (str or Path): The directory holding the segments and the index, created if needed.
+            max_segment_bytes (int): The compressed size after which a new segment is started.
+            max_segments (int): The number of segments kept on disk.
+            chunk_bytes (int): The amount of buffered text that triggers a write.
+            flush_interval (float): The maximum time in seconds a line stays buffered.
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.directory / "index.bin"
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segments = max_segments
+        self.chunk_bytes = chunk_bytes
+        self.flush_interval = flush_interval
+
+        # The index may end with a partial record if the application was killed while writing it
+        records = self.read_index()
+        with open(self.index_path, "ab") as index_file:
+            index_file.truncate(len(records) * INDEX_RECORD.size)
+        self.segment_id = records[-1][2] if records else 0
+        if self.segment_path(self.segment_id).exists() and self.segment_path(self.segment_id).stat().st_size >= max_segment_bytes:
+            self.segment_id += 1
+
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def segment_path(self, segment_id):
+        return self.directory / f"segment-{segment_id:06d}.log.gz"
+
+    def append(self, text, timestamp=None):
+        """
+        Queue server output for writing. This never blocks.
+
+        Carriage returns are used by progress bars to redraw a line, only the last version of such a line is kept.
+
+        Args:
+            text (str): The output, possibly made of several lines.
+            timestamp (float): The time the output was received, defaults to now.
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        for line in text.split("\n"):
+            line = line.rstrip("\r").split("\r")[-1]
+            if line.strip():
+                self.queue.put((timestamp, line))
+
+    def flush(self, timeout=5.0):
+        """
+        Wait until every queued line is written.
+
+        Args:
+            timeout (float): The maximum time to wait in seconds.
+        """
+        done = threading.Event()
+        self.queue.put(done)
+        done.wait(timeout)
+
+    def close(self):
+        """
+        Write the queued lines and stop the writer thread.
+        """
+        self.queue.put(None)
+        self.thread.join(10.0)
+
+    def run(self):
+        """
+        The writer thread loop: buffer lines and write them in chunks.
+        """
+        buffer = []
+        buffer_bytes = 0
+        first_time = None
+        while True:
+            timeout = None if first_time is None else max(0.0, first_time + self.flush_interval - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = False
+
+            if isinstance(item, tuple):
+                buffer.append(item)
+                buffer_bytes += len(item[1]) + 16
+                if first_time is None:
+                    first_time = time.monotonic()
+                if buffer_bytes < self.chunk_bytes:
+                    continue
+
+            if buffer:
+                try:
+                    self.write_chunk(buffer)
+                except OSError as e:
+                    print(f"Couldn't write the server log: {e}")
+                buffer = []
+                buffer_bytes = 0
+                first_time = None
+
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is None:
+                break
+
+    def write_chunk(self, lines):
+        """
+        Compress a chunk of lines, append it to the current segment and index it.
+
+        Args:
+            lines (list): The (timestamp, line) tuples to write.
+        """
+        data = "".join(f"{timestamp:.3f}\t{line}\n" for timestamp, line in lines).encode("utf-8")
+        compressed = gzip.compress(data)
+        with open(self.segment_path(self.segment_id), "ab") as segment_file:
+            offset = segment_file.tell()
+            segment_file.write(compressed)
+        # The chunk is on disk before the index points to it
+        with open(self.index_path, "ab") as index_file:
+            index_file.write(INDEX_RECORD.pack(lines[0][0], lines[-1][0], self.segment_id, offset, len(compressed)))
+
+        if offset + len(compressed) >= self.max_segment_bytes:
+            self.segment_id += 1
+            self.remove_old_segments()
+
+    def remove_old_segments(self):
+        """
+        Delete the segments beyond the maximum count and drop their index records.
+        """
+        first_kept = self.segment_id - self.max_segments + 1
+        records = self.read_index()
+        if not records or records[0][2] >= first_kept:
+            return
+        for path in self.directory.glob("segment-*.log.gz"):
+            if int(path.name[len("segment-"):-len(".log.gz")]) < first_kept:
+                path.unlink()
+        temporary_path = self.index_path.with_suffix(".tmp")
+        with open(temporary_path, "wb") as index_file:
+            for record in records:
+                if record[2] >= first_kept:
+                    index_file.write(INDEX_RECORD.pack(*record))
+        os.replace(temporary_path, self.index_path)
+
+    def read_index(self):
+        """
+        Read every complete index record.
+
+        Returns:
+            list: The (first timestamp, last timestamp, segment id, offset, length) records, oldest first.
+        """
+        if not self.index_path.exists():
+            return []
+        with open(self.index_path, "rb") as index_file:
+            data = index_file.read()
+        count = len(data) // INDEX_RECORD.size
+        return [INDEX_RECORD.unpack_from(data, i * INDEX_RECORD.size) for i in range(count)]
+
+    def search(self, pattern="", start=None, end=None, regex=False, limit=1000):
+        """
+        Find the lines matching a pattern in a time range.
+
+        Only the chunks whose time span overlaps the range are decompressed.
+
+        Args:
+            pattern (str): The text to look for, an empty string matches every line.
+            start (float): The start of the time range as a Unix timestamp, None for no limit.
+            end (float): The end of the time range as a Unix timestamp, None for no limit.
+            regex (bool): True if the pattern is a regular expression.
+            limit (int): The maximum number of lines returned, the most recent ones are kept.
+
+        Returns:
+            tuple: The list of matching (timestamp, line) tuples, oldest first, and the number of chunks read.
+        """
+        self.flush()
+        start = float("-inf") if start is None else start
+        end = float("inf") if end is None else end
+        if regex:
+            matcher = re.compile(pattern).search
+        else:
+            matcher = lambda line: pattern in line
+
+        results = []
+        chunks_read = 0
+        segments = {}
+        try:
+            with open(self.index_path, "rb") as index_file:
+                size = os.fstat(index_file.fileno()).st_size
+                count = size // INDEX_RECORD.size
+                if count == 0:
+                    return results, chunks_read
+                with mmap.mmap(index_file.fileno(), count * INDEX_RECORD.size, access=mmap.ACCESS_READ) as index:
+                    # Timestamps only grow, so the first chunk ending after the start is found by bisection
+                    low, high = 0, count
+                    while low < high:
+                        middle = (low + high) // 2
+                        if INDEX_RECORD.unpack_from(index, middle * INDEX_RECORD.size)[1] < start:
+                            low = middle + 1
+                        else:
+                            high = middle
+                    for i in range(low, count):
+                        first_time, last_time, segment_id, offset, length = INDEX_RECORD.unpack_from(index, i * INDEX_RECORD.size)
+                        if first_time > end:
+                            break
+                        segment = self.open_segment(segments, segment_id)
+                        if segment is None or offset + length > len(segment):
+                            continue
+                        chunks_read += 1
+                        data = zlib.decompress(segment[offset:offset + length], wbits=31).decode("utf-8", errors="replace")
+                        for record in data.splitlines():
+                            timestamp, _, line = record.partition("\t")
+                            timestamp = float(timestamp)
+                            if start <= timestamp <= end and matcher(line):
+                                results.append((timestamp, line))
+                        if len(results) > limit:
+                            del results[:len(results) - limit]
+        finally:
+            for segment_file, segment in segments.values():
+                if segment is not None:
+                    segment.close()
+                segment_file.close()
+        return results, chunks_read
+
+    def open_segment(self, segments, segment_id):
+        """
+        Memory-map a segment, reusing the mapping if it is already open.
+
+        Args:
+            segments (dict): The open (file, mmap) pairs by segment id.
+            segment_id (int): The segment to open.
+
+        Returns:
+            mmap.mmap: The mapped segment, None if it was deleted or is empty.
+        """
+        if segment_id not in segments:
+            try:
+                segment_file = open(self.segment_path(segment_id), "rb")
+            except FileNotFoundError:
+                return None
+            size = os.fstat(segment_file.fileno()).st_size
+            segment = mmap.mmap(segment_file.fileno(), size, access=mmap.ACCESS_READ) if size else None
+            segments[segment_id] = (segment_file, segment)
+        return segments[segment_id][1]
+
+    def describe_results(self, results, chunks_read):
+        """
+        Format search results for display.
+
+        Args:
+            results (list): The (timestamp, line) tuples returned by `search`.
+            chunks_read (int): The number of chunks read by the search.
+
+        Returns:
+            str: The formatted results.
+        """
+        text = f"{len(results)} matching line(s), {chunks_read} chunk(s) read\n"
+        text += "\n".join(f"{format_time(timestamp)}  {line}" for timestamp, line in results)
+        return text
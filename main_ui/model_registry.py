@@ -0,0 +1,215 @@
+"""
+    Petals Server Installer - Client model registry
+
+    Author: ParisNeo
+    Version: 1.0.0
+    Description: Keeps several client models and tokenizers loaded at once for the test client.
+
+    Entries are keyed by (model name, dtype) and evicted in least-recently-used order whenever their
+    combined resident memory exceeds the configured budget.
+"""
+import threading
+from collections import OrderedDict
+
+
+def estimate_model_memory(model):
+    """
+    Estimate the resident memory of a model in bytes.
+
+    Only the parameters and buffers that are held locally are counted. For a distributed petals model this is
+    the embeddings, the final norm and the LM head, the transformer blocks themselves live on the swarm.
+
+    Args:
+        model: The model whose memory should be estimated.
+
+    Returns:
+        int: The estimated number of bytes held by the model.
+    """
+    total = 0
+    tensors = []
+    if hasattr(model, "parameters"):
+        tensors.extend(model.parameters())
+    if hasattr(model, "buffers"):
+        tensors.extend(model.buffers())
+    seen = set()
+    for tensor in tensors:
+        # Tied weights (e.g. embeddings and LM head) must only be counted once
+        if id(tensor) in seen:
+            continue
+        seen.add(id(tensor))
+        total += tensor.numel() * tensor.element_size()
+    return total
+
+
+class RegistryEntry:
+    """
+    A loaded client model along with its tokenizer and resident memory.
+
+    Attributes:
+        model: The loaded model.
+        tokenizer: The tokenizer matching the model.
+        memory (int): The resident memory of the model in bytes.
+    """
+
+    def __init__(self, model, tokenizer, memory):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.memory = memory
+
+
+class ModelRegistry:
+    """
+    A least-recently-used cache of client models and tokenizers.
+
+    The registry does not know how to build models itself: it is given a loader callable which receives the key
+    parts and returns a (model, tokenizer) tuple. This keeps the registry independent of petals and transformers.
+    It can be shared between threads: loading a model does not block the lookups of other models, and a model
+    requested from two threads at once is only loaded once.
+
+    Attributes:
+        loader (callable): Builds a (model, tokenizer) tuple from a model name and a dtype.
+        memory_budget (int): The maximum resident memory in bytes, 0 disables the limit.
+        memory_estimator (callable): Returns the resident memory of a model in bytes.
+        hits (int): The number of lookups served from the registry.
+        misses (int): The number of lookups that required loading a model.
+        evictions (int): The number of entries dropped to stay within the memory budget.
+    """
+
+    def __init__(self, loader, memory_budget=0, memory_estimator=estimate_model_memory):
+        """
+        Initialize a ModelRegistry instance.
+
+        Args:
+            loader (callable): Builds a (model, tokenizer) tuple from the key parts.
+            memory_budget (int): The maximum resident memory in bytes, 0 disables the limit.
+            memory_estimator (callable): Returns the resident memory of a model in bytes.
+        """
+        self.loader = loader
+        self.memory_budget = memory_budget
+        self.memory_estimator = memory_estimator
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.RLock()
+        # The keys being loaded, with the event set once their load is over
+        self.loading = {}
+
+    def get(self, *key):
+        """
+        Get the model and tokenizer for a key, loading them if needed.
+
+        The entry becomes the most recently used one. If loading it makes the registry exceed its memory budget,
+        the least recently used entries are evicted. The requested entry is never evicted, even when it alone
+        exceeds the budget.
+
+        Args:
+            *key: The key parts, typically the model name and the dtype name.
+
+        Returns:
+            tuple: The (model, tokenizer) tuple for the key.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return entry.model, entry.tokenizer
+            loaded = self.loading.get(key)
+            if loaded is None:
+                self.misses += 1
+                self.loading[key] = threading.Event()
+
+        if loaded is not None:
+            # Another thread is loading this key, use its result (or retry if its load failed)
+            loaded.wait()
+            return self.get(*key)
+
+        # The lock is not held while loading, which can take a long time
+        try:
+            model, tokenizer = self.loader(*key)
+            entry = RegistryEntry(model, tokenizer, self.memory_estimator(model))
+            with self.lock:
+                self.entries[key] = entry
+                self.evict()
+        finally:
+            with self.lock:
+                self.loading.pop(key).set()
+        return model, tokenizer
+
+    def evict(self):
+        """
+        Evict least recently used entries until the registry fits in its memory budget.
+
+        The most recently used entry is always kept.
+        """
+        if self.memory_budget <= 0:
+            return
+        with self.lock:
+            while len(self.entries) > 1 and self.memory_usage() > self.memory_budget:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def set_memory_budget(self, memory_budget):
+        """
+        Change the memory budget and evict entries that no longer fit.
+
+        Args:
+            memory_budget (int): The maximum resident memory in bytes, 0 disables the limit.
+        """
+        with self.lock:
+            self.memory_budget = memory_budget
+            self.evict()
+
+    def memory_usage(self):
+        """
+        Get the combined resident memory of all the loaded entries.
+
+        Returns:
+            int: The number of bytes held by the registry.
+        """
+        return sum(entry.memory for entry in list(self.entries.values()))
+
+    def clear(self):
+        """
+        Drop every loaded entry. Statistics are kept.
+        """
+        with self.lock:
+            self.entries.clear()
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        """
+        Get the registry statistics.
+
+        Returns:
+            dict: The hit, miss and eviction counters, the number of entries and the memory usage and budget in bytes.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "memory": self.memory_usage(),
+            "memory_budget": self.memory_budget,
+        }
+
+    def describe(self):
+        """
+        Build a human readable summary of the registry.
+
+        Returns:
+            str: A multi-line description of the statistics and the loaded entries, most recently used last.
+        """
+        stats = self.stats()
+        budget = f"{stats['memory_budget'] / 2**30:.2f} GB" if stats["memory_budget"] > 0 else "unlimited"
+        text = f"Client model cache: {stats['entries']} loaded, {stats['memory'] / 2**30:.2f} GB / {budget}\n"
+        text += f"Hits: {stats['hits']}  Misses: {stats['misses']}  Evictions: {stats['evictions']}\n"
+        for key, entry in list(self.entries.items()):
+            text += f"  {' / '.join(str(part) for part in key)}: {entry.memory / 2**20:.1f} MB\n"
+        return text
@@ -12,7 +12,7 @@ import subprocess
 import psutil
 import yaml
 from pathlib import Path
-from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, QComboBox, QTextEdit, QSplitter,  QSpinBox, QTabWidget, QGroupBox, QTextBrowser, QMessageBox
+from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, QComboBox, QTextEdit, QSplitter,  QSpinBox, QTabWidget, QGroupBox, QTextBrowser, QMessageBox, QCheckBox
 from PyQt5.QtGui import QTextCursor, QTextOption, QFont
 from PyQt5.QtCore import QProcess, Qt
 
@@ -27,6 +27,15 @@ from PyQt5.QtWebEngineWidgets import QWebEngineView, QWebEngineSettings
 
 import torch
 
+from model_registry import ModelRegistry
+from conversation import Conversation, get_context_length, split_context
+from server_launcher import LaunchTimer, can_fork, command_line, launcher_message, parse_own_peer_id
+from load_tester import LoadProfile, LoadTester, PetalsBackend, StubBackend
+from log_store import LogStore, parse_time
+from local_modules import LocalComputeProfiler, place_local_modules
+from route_selector import PetalsPeerSource, RouteSelector
+from cache_manager import CacheManager, format_block_ranges, parse_block_range, parse_served_blocks
+
 # Helper constants and functions ============================================
 # The data types that can be used for inference 
 dtypes = [
@@ -79,6 +88,7 @@ class GenerationThread(QThread):
         self.user_prompt = user_prompt
         self.formatted_message = formatted_message
         self.max_new_tokens = max_new_tokens
+        self.local_compute_report = ""
 
     def run(self):
         """
@@ -86,16 +96,193 @@ class GenerationThread(QThread):
 
         This method performs the text generation process using the provided model, tokenizer, user input, formatted
         message, and maximum number of tokens. It emits the 'finished' signal with the generated text when the
-        generation is completed.
+        generation is completed. The time spent in the locally executed modules is kept in 'local_compute_report'.
 
         """
         # Generate response in a background thread
-        inputs = self.tokenizer(self.formatted_message, return_tensors="pt")["input_ids"]
-        outputs = self.model.generate(inputs, max_new_tokens=self.max_new_tokens)
-        generated_text = self.tokenizer.decode(outputs[0])
-        generated_text = generated_text.replace("<s> ", "").replace("</s>", "")[len(self.formatted_message):]
+        inputs = self.tokenizer(self.formatted_message, return_tensors="pt")["input_ids"].to(self.model.device)
+        with LocalComputeProfiler(self.model) as profiler:
+            outputs = self.model.generate(inputs, max_new_tokens=self.max_new_tokens)
+        self.local_compute_report = profiler.describe()
+        # Only the new tokens are decoded: decoding the prompt again does not always give back the same characters
+        generated_text = self.tokenizer.decode(outputs[0][inputs.shape[1]:], skip_special_tokens=True)
         self.finished.emit(generated_text)
 
+# Load Test Thread ===============================================
+class LoadTestThread(QThread):
+    """
+    A PyQt QThread class running a load test in the background.
+
+    The backend is built inside the thread because loading its model, pinned to the local node or not, takes a while.
+
+    Attributes:
+        progress (pyqtSignal): A PyQt signal emitted after every request, carrying a progress message.
+        finished (pyqtSignal): A PyQt signal emitted when the test is completed, carrying the report.
+
+    """
+
+    progress = pyqtSignal(str)
+    finished = pyqtSignal(str)
+
+    def __init__(self, backend_factory, profile):
+        """
+        Initialize a LoadTestThread instance.
+
+        Args:
+            backend_factory (callable): Builds the backend the requests are sent through.
+            profile (LoadProfile): The shape of the generated traffic.
+
+        """
+        super().__init__()
+        self.backend_factory = backend_factory
+        self.profile = profile
+
+    def run(self):
+        """
+        Build the backend, run the load test and emit the report.
+        """
+        try:
+            self.progress.emit("Preparing the backend ...")
+            backend = self.backend_factory()
+            tester = LoadTester(backend, self.profile)
+            report = tester.run(lambda done, total: self.progress.emit(f"{done} / {total} requests done"))
+            self.finished.emit(report.describe())
+        except Exception as e:
+            self.finished.emit(f"Load test failed: {str(e)}")
+
+# Log Search Thread ===============================================
+class LogSearchThread(QThread):
+    """
+    A PyQt QThread class searching the server log store in the background.
+
+    Attributes:
+        finished (pyqtSignal): A PyQt signal emitted when the search is completed, carrying the formatted results.
+
+    """
+
+    finished = pyqtSignal(str)
+
+    def __init__(self, log_store, pattern, start, end):
+        """
+        Initialize a LogSearchThread instance.
+
+        Args:
+            log_store (LogStore): The log store to search.
+            pattern (str): The text to look for.
+            start (float): The start of the time range as a Unix timestamp, or None.
+            end (float): The end of the time range as a Unix timestamp, or None.
+
+        """
+        super().__init__()
+        self.log_store = log_store
+        self.pattern = pattern
+        self.start_time = start
+        self.end_time = end
+
+    def run(self):
+        """
+        Search the log store and emit the formatted results.
+        """
+        try:
+            results, chunks_read = self.log_store.search(self.pattern, self.start_time, self.end_time)
+            self.finished.emit(self.log_store.describe_results(results, chunks_read))
+        except Exception as e:
+            self.finished.emit(f"Search failed: {str(e)}")
+
+# Cache Task Thread ===============================================
+class CacheTaskThread(QThread):
+    """
+    A PyQt QThread class running a cache manager task (pre-staging, verification) in the background.
+
+    Attributes:
+        progress (pyqtSignal): A PyQt signal emitted with progress messages.
+        finished (pyqtSignal): A PyQt signal emitted when the task is completed, carrying its result message.
+
+    """
+
+    progress = pyqtSignal(str)
+    finished = pyqtSignal(str)
+
+    def __init__(self, task):
+        """
+        Initialize a CacheTaskThread instance.
+
+        Args:
+            task (callable): Called with a progress callback, returns the result message.
+
+        """
+        super().__init__()
+        self.task = task
+
+    def run(self):
+        """
+        Run the task and emit its result.
+        """
+        try:
+            self.finished.emit(self.task(self.progress.emit))
+        except Exception as e:
+            self.finished.emit(f"Cache task failed: {str(e)}")
+
+# Route Monitor Thread ===============================================
+class RouteMonitorThread(QThread):
+    """
+    A PyQt QThread class keeping the test client on a low latency route.
+
+    It picks a route through the swarm, then periodically probes the peers of the route and picks a new one when
+    a peer degrades.
+
+    Attributes:
+        updated (pyqtSignal): A PyQt signal emitted after every check, carrying the route report.
+
+    """
+
+    updated = pyqtSignal(str)
+
+    def __init__(self, model, interval=30):
+        """
+        Initialize a RouteMonitorThread instance.
+
+        Args:
+            model: The distributed model whose routes are managed.
+            interval (int): The time in seconds between two checks.
+
+        """
+        super().__init__()
+        self.model = model
+        self.interval = interval
+        self.running = True
+
+    def stop(self):
+        """
+        Ask the thread to stop after its current check.
+        """
+        self.running = False
+
+    def run(self):
+        """
+        Check the route until the thread is stopped.
+        """
+        try:
+            selector = RouteSelector(PetalsPeerSource(self.model))
+        except Exception as e:
+            self.updated.emit(f"Route selection unavailable: {str(e)}")
+            return
+        while self.running:
+            try:
+                selector.check()
+                self.updated.emit(selector.describe())
+            except Exception as e:
+                self.updated.emit(f"Route check failed: {str(e)}\n" + selector.describe())
+            for _ in range(self.interval * 10):
+                if not self.running:
+                    break
+                self.msleep(100)
+        # The model is shared through the model registry, it must not stay pinned to the last route
+        try:
+            selector.release()
+        except Exception as e:
+            print(f"Could not release the route: {str(e)}")
+
 # Main class ============================================================
 class PetalsServiceMonitor(QMainWindow):
     """
@@ -131,9 +318,42 @@ class PetalsServiceMonitor(QMainWindow):
         # Initialize model to None for inference
         self.model = None
 
+        # Client models and tokenizers stay loaded here so switching between them is instant
+        self.model_registry = ModelRegistry(self.load_client_model, int(self.config["client_memory_budget_gb"] * 2**30))
+
         # No generation thread yet
         self.generation_thread = None
 
+        # The multi-turn conversation of the test client, created with the first prompt
+        self.conversation = None
+        # The max_new_tokens setting, reduced if needed to fit in the context with the prompt
+        self.generation_max_new_tokens = self.config["max_new_tokens"]
+
+        # Every line of server output is kept on disk
+        self.log_store = LogStore(
+            Path(__file__).resolve().parent / "logs",
+            max_segment_bytes=self.config["log_max_segment_mb"] * 2**20,
+            max_segments=self.config["log_max_segments"],
+        )
+        self.log_search_thread = None
+
+        # The block weights cached for the servers
+        self.cache_manager = CacheManager(quota_bytes=self.config["cache_quota_gb"] * 2**30)
+        self.cache_task_thread = None
+
+        # No route monitor yet, it starts with the first generation when route selection is enabled
+        self.route_monitor_thread = None
+        self.stopping_route_monitors = []
+
+        # No load test thread yet, and the peer id of the local server is only known once it runs
+        self.load_test_thread = None
+        self.node_peer_id = None
+
+        # The warm launcher the servers are forked from, started with the first server
+        self.launcher_process = None
+        self.launcher_ready = False
+        self.launch_timer = None
+
         self.setWindowTitle("Petals Service monitor UI")
         self.setGeometry(100, 100, 800, 500)
 
@@ -212,6 +432,8 @@ class PetalsServiceMonitor(QMainWindow):
         self.create_settings_tab()
         self.create_resources_tab()
         self.create_text_generation_tab()
+        self.create_load_test_tab()
+        self.create_cache_tab()
         self.create_about_tab()
 
         # Add the tab widget to the layout
@@ -270,6 +492,12 @@ class PetalsServiceMonitor(QMainWindow):
         server_settings_layout.addWidget(self.num_blocks_label)
         server_settings_layout.addWidget(self.num_blocks_entry)
 
+        self.warm_launcher_check = QCheckBox("Keep a warm server launcher (faster restarts)")
+        self.warm_launcher_check.setStyleSheet("color: white;")
+        self.warm_launcher_check.setChecked(self.config["warm_launcher"])
+        self.warm_launcher_check.setEnabled(can_fork())
+        server_settings_layout.addWidget(self.warm_launcher_check)
+
         server_settings_group.setLayout(server_settings_layout)
         
         # Inference Settings
@@ -285,6 +513,14 @@ class PetalsServiceMonitor(QMainWindow):
         inference_settings_layout.addWidget(self.text_gen_system_prompt_label)
         inference_settings_layout.addWidget(self.text_gen_system_prompt_text)
 
+        self.context_length_label = QLabel("Context length (0 for the model's own):")
+        self.context_length_input = QSpinBox()
+        self.context_length_input.setMinimum(0)
+        self.context_length_input.setMaximum(131072)
+        self.context_length_input.setValue(self.config["context_length"])
+        inference_settings_layout.addWidget(self.context_length_label)
+        inference_settings_layout.addWidget(self.context_length_input)
+
         self.max_new_tokens_label = QLabel("Max new tokens for inference:")
         self.max_new_tokens_input = QSpinBox()
         self.max_new_tokens_input.setMinimum(5)  # Set minimum value
@@ -304,6 +540,24 @@ class PetalsServiceMonitor(QMainWindow):
         inference_settings_layout.addWidget(self.inference_label)
         inference_settings_layout.addWidget(self.inference_combo)
 
+        self.client_device_label = QLabel("Client device (embeddings and LM head):")
+        self.client_device_combo = QComboBox()
+        self.client_device_combo.addItem("Same as the server device")
+        for device in self.devices:
+            self.client_device_combo.addItem(device)
+        if self.config["client_device"] < len(self.devices):
+            self.client_device_combo.setCurrentIndex(self.config["client_device"] + 1)
+        inference_settings_layout.addWidget(self.client_device_label)
+        inference_settings_layout.addWidget(self.client_device_combo)
+
+        self.client_memory_budget_label = QLabel("Client model cache budget (GB, 0 for unlimited):")
+        self.client_memory_budget_input = QSpinBox()
+        self.client_memory_budget_input.setMinimum(0)
+        self.client_memory_budget_input.setMaximum(1024)
+        self.client_memory_budget_input.setValue(self.config["client_memory_budget_gb"])
+        inference_settings_layout.addWidget(self.client_memory_budget_label)
+        inference_settings_layout.addWidget(self.client_memory_budget_input)
+
         inference_settings_group.setLayout(inference_settings_layout)
         
         # Save Config Button
@@ -349,6 +603,29 @@ class PetalsServiceMonitor(QMainWindow):
         server_output_layout.addWidget(self.stdout_label)
         server_output_layout.addWidget(self.stdout_text)
 
+        # Search through the logs of this and previous runs
+        log_search_layout = QHBoxLayout()
+        self.log_search_input = QLineEdit()
+        self.log_search_input.setPlaceholderText("Search the server logs...")
+        self.log_search_input.returnPressed.connect(self.search_logs)
+        self.log_search_start = QLineEdit()
+        self.log_search_start.setPlaceholderText("From (YYYY-MM-DD HH:MM)")
+        self.log_search_end = QLineEdit()
+        self.log_search_end.setPlaceholderText("To (YYYY-MM-DD HH:MM)")
+        self.log_search_button = QPushButton("Search Logs")
+        self.log_search_button.clicked.connect(self.search_logs)
+        log_search_layout.addWidget(self.log_search_input)
+        log_search_layout.addWidget(self.log_search_start)
+        log_search_layout.addWidget(self.log_search_end)
+        log_search_layout.addWidget(self.log_search_button)
+        server_output_layout.addLayout(log_search_layout)
+
+        self.log_search_results = QTextEdit()
+        self.log_search_results.setReadOnly(True)
+        self.log_search_results.setFont(monospaced_font)
+        self.log_search_results.setLineWrapMode(QTextEdit.NoWrap)
+        server_output_layout.addWidget(self.log_search_results)
+
         server_output_widget.setLayout(server_output_layout)
         self.tab_widget.addTab(server_output_widget, "Server Output")
 
@@ -444,8 +721,28 @@ class PetalsServiceMonitor(QMainWindow):
         self.generate_button.clicked.connect(self.generate_response)
         input_layout.addWidget(self.generate_button)
         self.generate_button.setEnabled(False)
+        # QPushButton to forget the previous turns
+        self.new_conversation_button = QPushButton("New Conversation")
+        self.new_conversation_button.clicked.connect(self.reset_conversation)
+        input_layout.addWidget(self.new_conversation_button)
         text_generation_layout.addLayout(input_layout)
 
+        self.context_label = QLabel("")
+        text_generation_layout.addWidget(self.context_label)
+
+        # Route decisions and peer timings
+        self.route_selection_check = QCheckBox("Pick low latency routes through the swarm")
+        self.route_selection_check.setStyleSheet("color: white;")
+        self.route_selection_check.setChecked(self.config["route_selection"])
+        self.route_selection_check.toggled.connect(self.toggle_route_selection)
+        text_generation_layout.addWidget(self.route_selection_check)
+        self.route_info = QTextEdit()
+        self.route_info.setReadOnly(True)
+        self.route_info.setFont(QFont("Courier New", 10))
+        self.route_info.setLineWrapMode(QTextEdit.NoWrap)
+        self.route_info.setMaximumHeight(150)
+        text_generation_layout.addWidget(self.route_info)
+
         text_generation_widget.setLayout(text_generation_layout)
         self.tab_widget.addTab(text_generation_widget, "Text Generation")
 
@@ -453,6 +750,110 @@ class PetalsServiceMonitor(QMainWindow):
         self.server_process = None
 
 
+    def create_load_test_tab(self):
+        """
+        Create a tab for load testing the local node.
+
+        This method initializes and sets up a tab to drive concurrent inference sessions with configurable prompt and
+        output lengths and ramp-up, and to display the throughput, latency, error and resource usage report.
+
+        """
+        load_test_widget = QWidget()
+        load_test_layout = QVBoxLayout()
+
+        def add_spin_box(label, minimum, maximum, value):
+            spin_box = QSpinBox()
+            spin_box.setMinimum(minimum)
+            spin_box.setMaximum(maximum)
+            spin_box.setValue(value)
+            row = QHBoxLayout()
+            row.addWidget(QLabel(label))
+            row.addWidget(spin_box)
+            load_test_layout.addLayout(row)
+            return spin_box
+
+        self.load_sessions_input = add_spin_box("Concurrent sessions:", 1, 1024, 4)
+        self.load_requests_input = add_spin_box("Requests per session:", 1, 1000, 1)
+        self.load_ramp_up_input = add_spin_box("Ramp-up (seconds):", 0, 3600, 10)
+        self.load_prompt_min_input = add_spin_box("Prompt tokens (min):", 1, 16384, 16)
+        self.load_prompt_max_input = add_spin_box("Prompt tokens (max):", 1, 16384, 128)
+        self.load_output_min_input = add_spin_box("Generated tokens (min):", 1, 16384, 16)
+        self.load_output_max_input = add_spin_box("Generated tokens (max):", 1, 16384, 64)
+
+        self.load_pin_check = QCheckBox("Only use my node (it must serve every block of the model)")
+        self.load_pin_check.setStyleSheet("color: white;")
+        load_test_layout.addWidget(self.load_pin_check)
+        self.load_stub_check = QCheckBox("Use a simulated backend (dry run, no swarm)")
+        self.load_stub_check.setStyleSheet("color: white;")
+        load_test_layout.addWidget(self.load_stub_check)
+
+        self.load_test_button = QPushButton("Run Load Test")
+        self.load_test_button.clicked.connect(self.run_load_test)
+        load_test_layout.addWidget(self.load_test_button)
+
+        self.load_test_status = QLabel("")
+        load_test_layout.addWidget(self.load_test_status)
+        self.load_test_report = QTextEdit()
+        self.load_test_report.setReadOnly(True)
+        self.load_test_report.setFont(QFont("Courier New", 10))
+        load_test_layout.addWidget(self.load_test_report)
+
+        load_test_widget.setLayout(load_test_layout)
+        self.tab_widget.addTab(load_test_widget, "Load Test")
+
+    def create_cache_tab(self):
+        """
+        Create a tab for managing the cached block weights.
+
+        This method initializes and sets up a tab showing which blocks of which models are cached, and buttons to
+        pre-stage the weights of the blocks this node will serve, verify the cache and enforce the disk quota.
+
+        """
+        cache_widget = QWidget()
+        cache_layout = QVBoxLayout()
+
+        quota_layout = QHBoxLayout()
+        quota_layout.addWidget(QLabel("Disk quota (GB, 0 for unlimited):"))
+        self.cache_quota_input = QSpinBox()
+        self.cache_quota_input.setMinimum(0)
+        self.cache_quota_input.setMaximum(100000)
+        self.cache_quota_input.setValue(self.config["cache_quota_gb"])
+        quota_layout.addWidget(self.cache_quota_input)
+        cache_layout.addLayout(quota_layout)
+
+        blocks_layout = QHBoxLayout()
+        blocks_layout.addWidget(QLabel("Blocks to pre-stage for the selected model:"))
+        self.cache_blocks_entry = QLineEdit()
+        self.cache_blocks_entry.setPlaceholderText("e.g. 0-11 (defaults to the blocks served last time)")
+        blocks_layout.addWidget(self.cache_blocks_entry)
+        cache_layout.addLayout(blocks_layout)
+
+        buttons_layout = QHBoxLayout()
+        self.cache_refresh_button = QPushButton("Refresh")
+        self.cache_refresh_button.clicked.connect(self.refresh_cache_info)
+        self.cache_prestage_button = QPushButton("Pre-stage Blocks")
+        self.cache_prestage_button.clicked.connect(self.prestage_blocks)
+        self.cache_verify_button = QPushButton("Verify")
+        self.cache_verify_button.clicked.connect(self.verify_cache)
+        self.cache_quota_button = QPushButton("Enforce Quota")
+        self.cache_quota_button.clicked.connect(self.enforce_cache_quota)
+        for button in [self.cache_refresh_button, self.cache_prestage_button, self.cache_verify_button, self.cache_quota_button]:
+            buttons_layout.addWidget(button)
+        cache_layout.addLayout(buttons_layout)
+
+        self.cache_status = QLabel("")
+        cache_layout.addWidget(self.cache_status)
+        self.cache_info = QTextEdit()
+        self.cache_info.setReadOnly(True)
+        self.cache_info.setFont(QFont("Courier New", 10))
+        cache_layout.addWidget(self.cache_info)
+
+        cache_widget.setLayout(cache_layout)
+        self.tab_widget.addTab(cache_widget, "Cache")
+
+        # Switching models pre-stages the blocks this node served last time it ran the new model
+        self.model_combo.currentIndexChanged.connect(self.prestage_remembered_blocks)
+
     def create_about_tab(self):
         about_widget = QWidget()
         about_layout = QVBoxLayout()
@@ -548,7 +949,15 @@ class PetalsServiceMonitor(QMainWindow):
             'inference_dtype_id': 0,
             'generation_template': "{system_prompt}### User: {message}\n\n### Assistant:\n",
             "system_prompt": "Act as an AI assistant that is always ready to provide useful information and assistance. Help the user acheive his task.",
-            'max_new_tokens': 1024
+            'max_new_tokens': 1024,
+            'client_memory_budget_gb': 8,
+            'context_length': 0,
+            'warm_launcher': True,
+            'log_max_segment_mb': 64,
+            'log_max_segments': 50,
+            'cache_quota_gb': 0,
+            'route_selection': False,
+            'client_device': -1
         }
 
         # Check if config.yaml exists in the current folder
@@ -592,6 +1001,11 @@ class PetalsServiceMonitor(QMainWindow):
         max_new_tokens = self.max_new_tokens_input.value()
 
         inference_dtype_id = self.inference_combo.currentIndex()
+        client_memory_budget_gb = self.client_memory_budget_input.value()
+        client_device = self.client_device_combo.currentIndex() - 1
+        context_length = self.context_length_input.value()
+        warm_launcher = self.warm_launcher_check.isChecked()
+        cache_quota_gb = self.cache_quota_input.value()
 
         generation_template = self.text_gen_template_text.toPlainText().strip()
         system_prompt = self.text_gen_system_prompt_text.toPlainText().strip()
@@ -607,8 +1021,15 @@ class PetalsServiceMonitor(QMainWindow):
             'inference_dtype_id': inference_dtype_id,
             'max_new_tokens': max_new_tokens,
             'generation_template':generation_template,
-            'system_prompt':system_prompt
+            'system_prompt':system_prompt,
+            'client_memory_budget_gb': client_memory_budget_gb,
+            'context_length': context_length,
+            'warm_launcher': warm_launcher,
+            'cache_quota_gb': cache_quota_gb,
+            'route_selection': self.route_selection_check.isChecked(),
+            'client_device': client_device
         })
+        self.model_registry.set_memory_budget(client_memory_budget_gb * 2**30)
 
     def save_config(self, show_saved=True):
         """
@@ -678,12 +1099,10 @@ class PetalsServiceMonitor(QMainWindow):
 
         """
         if self.start_server_button.text() == "Stop Server":
-            enableGroupBoxContent(self.server_settings_group)
-            self.model = None
-            self.input_prompt.setEnabled(False)
-            self.generate_button.setEnabled(False)
-            self.server_process.terminate()
-            self.start_server_button.setText("Start Server")
+            # The UI goes back to the stopped state once the launcher reports that the server exited
+            self.start_server_button.setText("Stopping ...")
+            self.start_server_button.setEnabled(False)
+            self.stop_server_process()
         else:
             self.save_config(show_saved=False)
             disableGroupBoxContent(self.server_settings_group)
@@ -702,11 +1121,10 @@ class PetalsServiceMonitor(QMainWindow):
 
             # Choose any model available at https://health.petals.dev
             self.model_name = selected_model_name
+            # The model being served is the last one the cache quota evicts
+            self.cache_manager.touch(selected_model_name)
 
             command = [
-                "python3",
-                "-m",
-                "petals.cli.run_server",
                 selected_model["name"],
                 "--public_name",
                 node_name,
@@ -722,24 +1140,153 @@ class PetalsServiceMonitor(QMainWindow):
 
             print(f"Command : {command}")
             try:
-                # Start the server process and capture its stdout
-                self.server_process = QProcess()
-                self.server_process.setProcessChannelMode(QProcess.MergedChannels)
-                self.server_process.readyReadStandardOutput.connect(self.update_stdout_text)
-                self.server_process.start(" ".join(command))
-                self.resource_info.setText("Server started successfully!")
+                # Start the server process and capture its stdout, the launcher reports when it is started
+                self.launch_server_process(command)
+                self.resource_info.setText("Starting the server ...")
                 self.start_server_button.setText("Stop Server")
-
-                # Update resource usage information
-                self.update_resource_info()
             except Exception as e:
                 self.resource_info.setText(f"Error starting the server: {str(e)}")
+                self.set_server_stopped()
 
             # Force the application to execute the event loop
-            self.generate_button.setEnabled(True)
-            self.input_prompt.setEnabled(True)
             QCoreApplication.processEvents()
 
+    def set_server_started(self):
+        """
+        Put the UI in the running server state, once the launcher reports the server is started.
+        """
+        self.resource_info.setText("Server started successfully!")
+        # Update resource usage information
+        self.update_resource_info()
+        self.generate_button.setEnabled(True)
+        self.input_prompt.setEnabled(True)
+
+
+    def create_process(self, args):
+        """
+        Start a Python process whose output goes to the server output tab.
+
+        Args:
+            args (list): The interpreter arguments.
+
+        Returns:
+            QProcess: The started process.
+        """
+        process = QProcess()
+        process.setProcessChannelMode(QProcess.MergedChannels)
+        process.readyReadStandardOutput.connect(self.update_stdout_text)
+        process.finished.connect(lambda: self.handle_process_finished(process))
+        # Arguments are passed as a list so that node names with spaces stay intact
+        process.start(sys.executable, args)
+        return process
+
+    def launch_server_process(self, server_args):
+        """
+        Start a petals server.
+
+        When the warm launcher is enabled, the server is forked from an interpreter that has already imported torch,
+        transformers and petals, which is started on the first call and kept between servers. Otherwise a new
+        interpreter imports everything and runs the server.
+
+        Args:
+            server_args (list): The petals.cli.run_server arguments.
+        """
+        launcher_path = str(Path(__file__).resolve().parent / "server_launcher.py")
+        if self.config["warm_launcher"] and can_fork():
+            if self.launcher_process is None or self.launcher_process.state() == QProcess.NotRunning:
+                self.launcher_ready = False
+                self.launcher_process = self.create_process(["-u", launcher_path, "--zygote"])
+            self.server_process = self.launcher_process
+            self.launch_timer = LaunchTimer(warm=self.launcher_ready)
+            self.server_process.write(command_line("start", server_args))
+        else:
+            self.launch_timer = LaunchTimer()
+            self.server_process = self.create_process(["-u", launcher_path, "--cold"] + server_args)
+
+    def stop_server_process(self):
+        """
+        Stop the running petals server. The warm launcher, if any, stays ready for the next start.
+        """
+        if self.server_process is None:
+            return
+        if self.server_process is self.launcher_process:
+            self.server_process.write(command_line("stop"))
+        else:
+            self.server_process.terminate()
+
+    def handle_process_finished(self, process):
+        """
+        Put the UI back in the stopped state when the process running the server ends.
+
+        A cold server stopped with terminate() or a crashed launcher never prints its "exited" marker.
+
+        Args:
+            process (QProcess): The process that ended.
+        """
+        if process is self.launcher_process:
+            self.launcher_ready = False
+        if process is self.server_process and self.start_server_button.text() != "Start Server":
+            self.set_server_stopped()
+
+    def set_server_stopped(self):
+        """
+        Put the UI back in the stopped server state.
+        """
+        enableGroupBoxContent(self.server_settings_group)
+        self.warm_launcher_check.setEnabled(can_fork())
+        self.model = None
+        self.update_route_monitor()
+        self.node_peer_id = None
+        self.input_prompt.setEnabled(False)
+        self.generate_button.setEnabled(False)
+        self.start_server_button.setText("Start Server")
+        self.start_server_button.setEnabled(True)
+
+    def handle_launcher_line(self, line):
+        """
+        React to a line of server output: follow the launcher state and measure the start timings.
+
+        Args:
+            line (str): The output line.
+        """
+        peer_id = parse_own_peer_id(line)
+        if peer_id:
+            self.node_peer_id = peer_id
+        served_blocks = parse_served_blocks(line)
+        if served_blocks:
+            self.cache_manager.remember_blocks(self.model_name, served_blocks)
+        message = launcher_message(line)
+        if message is not None:
+            server_active = self.start_server_button.text() != "Start Server"
+            if message.startswith("ready "):
+                self.launcher_ready = True
+            elif message.startswith("started pid=") and server_active:
+                self.set_server_started()
+            elif message.startswith("error ") and server_active:
+                self.resource_info.setText(f"Error starting the server: {message}")
+                self.set_server_stopped()
+            elif message.startswith("exited code=") and server_active:
+                # The server was stopped, or stopped on its own (e.g. it crashed), allow restarting it
+                self.set_server_stopped()
+        if self.launch_timer is not None and self.launch_timer.feed(line):
+            self.stdout_text.append(self.launch_timer.describe())
+
+    def closeEvent(self, event):
+        """
+        Stop the warm launcher, and the server forked from it, when the window is closed.
+
+        Args:
+            event (QCloseEvent): The close event.
+        """
+        if self.launcher_process is not None and self.launcher_process.state() != QProcess.NotRunning:
+            self.launcher_process.write(command_line("quit"))
+            self.launcher_process.closeWriteChannel()
+            self.launcher_process.waitForFinished(5000)
+        if self.route_monitor_thread is not None:
+            self.route_monitor_thread.stop()
+            self.route_monitor_thread.wait(5000)
+        self.log_store.close()
+        super().closeEvent(event)
 
     def update_resource_info(self):
         """
@@ -757,6 +1304,7 @@ class PetalsServiceMonitor(QMainWindow):
         resource_text += f"Memory Usage: {memory_info.percent}%\n"
         resource_text += "GPU Information:\n"
         resource_text += gpu_info
+        resource_text += "\n" + self.model_registry.describe()
 
         self.resource_info.setText(resource_text)
 
@@ -769,8 +1317,10 @@ class PetalsServiceMonitor(QMainWindow):
         smooth and responsive display.
 
         """
-        data = self.server_process.readAll()
+        process = self.sender() or self.server_process
+        data = process.readAll()
         text = data.data().decode("utf-8")
+        self.log_store.append(text)
 
         # Check if the text contains carriage return characters
         if '\r' in text:
@@ -790,6 +1340,9 @@ class PetalsServiceMonitor(QMainWindow):
             # If no carriage return characters are found, simply append the text
             self.stdout_text.append(text)
 
+        for line in text.replace('\r', '\n').split('\n'):
+            self.handle_launcher_line(line.strip())
+
     # Create a function to generate and display responses
     def generate_response(self):
         """
@@ -804,28 +1357,302 @@ class PetalsServiceMonitor(QMainWindow):
         self.input_prompt.setEnabled(False)
 
         if self.model is None:
-            self.generate_button.setText("Loading ...")
-            QCoreApplication.processEvents()
             selected_model_name = self.model_combo.currentText()
             selected_model = next((model for model in self.models if model["name"] == selected_model_name), None)
-            # Connect to a distributed network hosting model layers
-            self.tokenizer = AutoTokenizer.from_pretrained(selected_model["name"])
-            self.model = AutoDistributedModelForCausalLM.from_pretrained(selected_model["name"], torch_dtype=dtypes[self.config["inference_dtype_id"]])
+            key = (selected_model["name"], str_dtypes[self.config["inference_dtype_id"]], self.get_client_device())
+            if key not in self.model_registry:
+                self.generate_button.setText("Loading ...")
+                QCoreApplication.processEvents()
+            self.model, self.tokenizer = self.model_registry.get(*key)
+            self.update_route_monitor()
 
         self.generate_button.setText("Generating...")
         QCoreApplication.processEvents()
         user_prompt = self.input_prompt.text()
         if user_prompt:
-            # Replace placeholders in the template
-            formatted_message = self.config["generation_template"].format(system_prompt=self.config["system_prompt"], message=user_prompt)
+            # Replace placeholders in the template, keeping as much history as the context budget allows
+            try:
+                formatted_message = self.get_conversation().build_prompt(user_prompt)
+            except ValueError as e:
+                self.context_label.setText(str(e))
+                self.generate_button.setText("Generate Response")
+                self.generate_button.setEnabled(True)
+                self.input_prompt.setEnabled(True)
+                return
 
             # Create and start the generation thread
-            self.generation_thread = GenerationThread(self.model, self.tokenizer, user_prompt, formatted_message, self.config["max_new_tokens"])
+            self.generation_thread = GenerationThread(self.model, self.tokenizer, user_prompt, formatted_message, self.generation_max_new_tokens)
             self.generation_thread.finished.connect(self.handle_generation_finished)
             self.generation_thread.start()
         else:
             self.response_text.setPlainText("Please enter a prompt.")
 
+    def search_logs(self):
+        """
+        Search the on-disk server logs with the pattern and time range of the server output tab.
+        """
+        try:
+            start = parse_time(self.log_search_start.text())
+            end = parse_time(self.log_search_end.text())
+        except ValueError as e:
+            self.log_search_results.setPlainText(str(e))
+            return
+        self.log_search_button.setEnabled(False)
+        self.log_search_results.setPlainText("Searching ...")
+        self.log_search_thread = LogSearchThread(self.log_store, self.log_search_input.text(), start, end)
+        self.log_search_thread.finished.connect(self.handle_log_search_finished)
+        self.log_search_thread.start()
+
+    def handle_log_search_finished(self, results):
+        """
+        Display the log search results.
+
+        Args:
+            results (str): The formatted results.
+
+        """
+        self.log_search_results.setPlainText(results)
+        self.log_search_button.setEnabled(True)
+
+    def run_cache_task(self, task):
+        """
+        Run a cache manager task in the background, one at a time.
+
+        Args:
+            task (callable): Called with a progress callback, returns the result message.
+
+        Returns:
+            bool: False if another task is still running.
+        """
+        if self.cache_task_thread is not None and self.cache_task_thread.isRunning():
+            self.cache_status.setText("Another cache task is still running")
+            return False
+        self.cache_manager.quota_bytes = self.cache_quota_input.value() * 2**30
+        self.cache_manager.token = self.token_entry.text().strip() or None
+        self.cache_task_thread = CacheTaskThread(task)
+        self.cache_task_thread.progress.connect(self.cache_status.setText)
+        self.cache_task_thread.finished.connect(self.handle_cache_task_finished)
+        self.cache_task_thread.start()
+        return True
+
+    def handle_cache_task_finished(self, message):
+        """
+        Display the result of a cache task and the updated cache content.
+
+        Args:
+            message (str): The result message.
+
+        """
+        self.cache_status.setText(message)
+        self.refresh_cache_info()
+
+    def refresh_cache_info(self):
+        """
+        Display the cached models and blocks.
+        """
+        self.cache_info.setPlainText(self.cache_manager.describe())
+
+    def prestage_blocks(self):
+        """
+        Download the weights of the blocks typed in the cache tab, or of the blocks served last time.
+        """
+        model_name = self.model_combo.currentText()
+        try:
+            blocks = parse_block_range(self.cache_blocks_entry.text()) or self.cache_manager.remembered_blocks(model_name)
+        except ValueError:
+            self.cache_status.setText("Invalid block range, expected e.g. 0-11, 20")
+            return
+        if not blocks:
+            self.cache_status.setText("No blocks to pre-stage: type a block range, this model never ran on this node")
+            return
+
+        def task(progress):
+            downloaded = self.cache_manager.prestage(model_name, blocks, progress)
+            return f"{model_name}: blocks {format_block_ranges(blocks)} staged, {len(downloaded)} shard(s) downloaded"
+        self.run_cache_task(task)
+
+    def prestage_remembered_blocks(self):
+        """
+        Pre-stage, in the background, the blocks the newly selected model served last time on this node.
+        """
+        model_name = self.model_combo.currentText()
+        blocks = self.cache_manager.remembered_blocks(model_name)
+        if blocks:
+            def task(progress):
+                downloaded = self.cache_manager.prestage(model_name, blocks, progress)
+                return f"{model_name}: blocks {format_block_ranges(blocks)} staged, {len(downloaded)} shard(s) downloaded"
+            self.run_cache_task(task)
+
+    def verify_cache(self):
+        """
+        Check the cached files of every model against their recorded hashes.
+        """
+        def task(progress):
+            corrupted = []
+            for model_name in self.cache_manager.cached_models():
+                progress(f"Verifying {model_name} ...")
+                corrupted.extend(f"{model_name}/{filename}" for filename in self.cache_manager.verify(model_name))
+            if corrupted:
+                return "Deleted corrupted files: " + ", ".join(corrupted)
+            return "All cached files are intact"
+        self.run_cache_task(task)
+
+    def enforce_cache_quota(self):
+        """
+        Evict the least recently used models until the cache fits in the quota. The selected model is kept.
+        """
+        model_name = self.model_combo.currentText()
+        def task(progress):
+            evicted = self.cache_manager.enforce_quota(keep=model_name)
+            return "Evicted: " + ", ".join(evicted) if evicted else "The cache fits in its quota"
+        self.run_cache_task(task)
+
+    def run_load_test(self):
+        """
+        Start a load test with the settings of the load test tab.
+        """
+        prompt_tokens = sorted([self.load_prompt_min_input.value(), self.load_prompt_max_input.value()])
+        new_tokens = sorted([self.load_output_min_input.value(), self.load_output_max_input.value()])
+        profile = LoadProfile(
+            sessions=self.load_sessions_input.value(),
+            requests_per_session=self.load_requests_input.value(),
+            ramp_up=self.load_ramp_up_input.value(),
+            prompt_tokens=tuple(prompt_tokens),
+            new_tokens=tuple(new_tokens),
+        )
+
+        if self.load_stub_check.isChecked():
+            backend_factory = StubBackend
+        else:
+            selected_model_name = self.model_combo.currentText()
+            dtype_name = str_dtypes[self.config["inference_dtype_id"]]
+            client_device = self.get_client_device()
+            if self.load_pin_check.isChecked():
+                if self.node_peer_id is None:
+                    self.load_test_status.setText("The local server is not running yet, its peer id is unknown.")
+                    return
+                allowed_servers = [self.node_peer_id]
+                # A pinned model only talks to this node, it is not shared with the test client
+                backend_factory = lambda: PetalsBackend(*self.load_client_model(selected_model_name, dtype_name, client_device, allowed_servers=allowed_servers))
+            else:
+                # Loading the model can take a while, the registry is only asked for it inside the thread
+                backend_factory = lambda: PetalsBackend(*self.model_registry.get(selected_model_name, dtype_name, client_device))
+
+        self.load_test_button.setEnabled(False)
+        self.load_test_report.clear()
+        self.load_test_thread = LoadTestThread(backend_factory, profile)
+        self.load_test_thread.progress.connect(self.load_test_status.setText)
+        self.load_test_thread.finished.connect(self.handle_load_test_finished)
+        self.load_test_thread.start()
+
+    def handle_load_test_finished(self, report):
+        """
+        Display the load test report.
+
+        Args:
+            report (str): The load test report.
+
+        """
+        self.load_test_report.setPlainText(report)
+        self.load_test_status.setText("Load test finished")
+        self.load_test_button.setEnabled(True)
+
+    def toggle_route_selection(self, enabled):
+        """
+        Enable or disable the low latency route selection.
+
+        Args:
+            enabled (bool): True to enable it.
+
+        """
+        self.config["route_selection"] = enabled
+        self.update_route_monitor()
+
+    def update_route_monitor(self):
+        """
+        Start, restart or stop the route monitor to follow the current model and setting.
+        """
+        monitor = self.route_monitor_thread
+        wanted = self.config["route_selection"] and self.model is not None
+        if monitor is not None and (not wanted or monitor.model is not self.model):
+            # Keep a reference until the thread is done with its current check
+            monitor.stop()
+            self.stopping_route_monitors.append(monitor)
+            monitor.finished.connect(lambda: self.stopping_route_monitors.remove(monitor))
+            self.route_monitor_thread = None
+        if wanted and self.route_monitor_thread is None:
+            self.route_info.setPlainText("Probing peers ...")
+            self.route_monitor_thread = RouteMonitorThread(self.model)
+            self.route_monitor_thread.updated.connect(self.route_info.setPlainText)
+            self.route_monitor_thread.start()
+        elif not wanted:
+            self.route_info.clear()
+
+    def get_conversation(self):
+        """
+        Get the current conversation, starting a new one if the model or the inference settings changed.
+
+        Returns:
+            Conversation: The conversation the next prompt belongs to.
+        """
+        conversation = self.conversation
+        if (
+            conversation is None
+            or conversation.tokenizer is not self.tokenizer
+            or conversation.template != self.config["generation_template"]
+            or conversation.system_prompt != self.config["system_prompt"]
+        ):
+            self.conversation = Conversation(self.tokenizer, self.config["generation_template"], self.config["system_prompt"], 0)
+        # The budget follows the settings without losing the history
+        context_length = get_context_length(self.model, self.tokenizer, self.config["context_length"])
+        prompt_budget, self.generation_max_new_tokens = split_context(context_length, self.config["max_new_tokens"])
+        self.conversation.set_budget(prompt_budget)
+        return self.conversation
+
+    def reset_conversation(self):
+        """
+        Forget the previous turns of the test client conversation.
+        """
+        self.conversation = None
+        self.response_text.clear()
+        self.context_label.setText("")
+
+    def get_client_device(self):
+        """
+        Get the device the locally executed modules of the client model run on.
+
+        Returns:
+            str: The client device if one is set, the server device otherwise.
+        """
+        client_device = self.config["client_device"]
+        if 0 <= client_device < len(self.devices):
+            return self.devices[client_device]
+        return self.devices[self.config["device"]]
+
+    def load_client_model(self, model_name, dtype_name, device="cpu", **kwargs):
+        """
+        Load a client model and its tokenizer.
+
+        This is the loader used by the model registry when a model is requested that is not loaded yet. Petals only
+        keeps the embeddings, the final norm and the LM head locally, they are moved to the client device.
+
+        Args:
+            model_name (str): The name of the model to load.
+            dtype_name (str): The name of the data type used for inference.
+            device (str): The device the local modules run on.
+            **kwargs: Extra client options, e.g. allowed_servers to only use some peers.
+
+        Returns:
+            tuple: The (model, tokenizer) tuple.
+        """
+        # Connect to a distributed network hosting model layers
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoDistributedModelForCausalLM.from_pretrained(
+            model_name, torch_dtype=dtypes[str_dtypes.index(dtype_name)], **kwargs
+        )
+        model = place_local_modules(model, device)
+        return model, tokenizer
+
     def handle_generation_finished(self, generated_text):
         """
         Handle the completion of response generation.
@@ -837,7 +1664,17 @@ class PetalsServiceMonitor(QMainWindow):
             generated_text (str): The generated response text.
 
         """
-        self.response_text.setPlainText(generated_text)
+        if self.conversation is not None:
+            self.conversation.add_answer(generated_text)
+            self.response_text.setPlainText(self.conversation.transcript())
+            context_text = self.conversation.describe()
+            if self.generation_thread.max_new_tokens < self.config["max_new_tokens"]:
+                context_length = self.conversation.budget + self.generation_thread.max_new_tokens
+                context_text += f"\nMax new tokens reduced to {self.generation_thread.max_new_tokens} to fit the {context_length} token context"
+            self.context_label.setText(context_text + "\n" + self.generation_thread.local_compute_report)
+            self.input_prompt.clear()
+        else:
+            self.response_text.setPlainText(generated_text)
         self.generate_button.setText("Generate Response")
         self.generate_button.setEnabled(True)
         self.input_prompt.setEnabled(True)
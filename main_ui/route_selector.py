@@ -0,0 +1,343 @@
+"""
+    Petals Server Installer - Route selector
+
+    Author: ParisNeo
+    Version: 1.0.0
+    Description: Probes the peers of the swarm and picks low latency routes for the test client.
+
+    Every token goes through a chain of peers that together serve all the blocks of the model. The time of an inference
+    step is the sum, over the peers of the chain, of the round trip time to the peer and of the time the peer takes to
+    run its part of the blocks. The route selector probes the round trip times of the candidate peers, keeps an
+    exponential moving average of them, picks the chain with the lowest estimated step time and picks a new one when a
+    peer of the current chain degrades.
+
+    Peers come from a peer source. PetalsPeerSource reads them from the swarm through a distributed petals model,
+    SimulatedPeerSource holds a fixed set of peers with injected latencies to exercise the selector offline.
+"""
+import random
+import time
+
+
+class PeerInfo:
+    """
+    A peer serving a span of blocks.
+
+    Attributes:
+        peer_id: The peer identifier, as used by the peer source.
+        start (int): The first block served.
+        end (int): The block after the last one served.
+        inference_rps (float): The number of blocks the peer runs per second for a single token.
+    """
+
+    def __init__(self, peer_id, start, end, inference_rps):
+        self.peer_id = peer_id
+        self.start = start
+        self.end = end
+        self.inference_rps = inference_rps if inference_rps else 1.0
+
+
+class Route:
+    """
+    A chain of peers serving every block of the model.
+
+    Attributes:
+        hops (list): The (peer_id, start, end) spans, in block order.
+        latency (float): The estimated time of an inference step in seconds.
+    """
+
+    def __init__(self, hops, latency):
+        self.hops = hops
+        self.latency = latency
+
+    def peer_ids(self):
+        return [peer_id for peer_id, _, _ in self.hops]
+
+    def describe(self):
+        """
+        Build a one line description of the route.
+
+        Returns:
+            str: The spans and their peers, and the estimated step time.
+        """
+        hops = " -> ".join(f"[{start}:{end}) {str(peer_id)[-8:]}" for peer_id, start, end in self.hops)
+        return f"{hops} (~{self.latency * 1000:.0f} ms/step)"
+
+
+class SimulatedPeerSource:
+    """
+    A fixed set of peers with injected latencies, used to test the route selector offline.
+
+    Attributes:
+        peers_info (list): The PeerInfo of every peer.
+        latencies (dict): The round trip time in seconds of every peer, None for an unreachable peer.
+        jitter (float): The relative random variation added to every probe.
+        applied_routes (list): The routes applied so far, None where the restriction was lifted.
+    """
+
+    def __init__(self, peers_info, latencies, jitter=0.0, seed=None):
+        self.peers_info = peers_info
+        self.latencies = dict(latencies)
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.applied_routes = []
+
+    def num_blocks(self):
+        return max(peer.end for peer in self.peers_info)
+
+    def peers(self):
+        return list(self.peers_info)
+
+    def probe(self, peer_id):
+        latency = self.latencies.get(peer_id)
+        if latency is None:
+            return None
+        return latency * (1.0 + self.random.uniform(-self.jitter, self.jitter))
+
+    def set_latency(self, peer_id, latency):
+        """
+        Inject a new round trip time for a peer, None to make it unreachable.
+
+        Args:
+            peer_id: The peer identifier.
+            latency (float): The round trip time in seconds.
+        """
+        self.latencies[peer_id] = latency
+
+    def apply_route(self, route):
+        self.applied_routes.append(route)
+
+
+class PetalsPeerSource:
+    """
+    The peers of the swarm serving a distributed petals model.
+
+    Routes are applied by restricting the servers the model's sequence manager may use to the peers of the route, the
+    sequence manager then builds its inference chains through them. Peers are discovered from the DHT, so that peers
+    outside the current route remain candidates. The model may be shared with other users, so its own restriction is
+    put back when no route is applied.
+
+    Attributes:
+        sequence_manager: The petals RemoteSequenceManager of the model.
+        original_allowed_servers: The servers the model was allowed to use before any route was applied.
+    """
+
+    def __init__(self, model):
+        self.sequence_manager = None
+        for module in model.modules():
+            if hasattr(module, "sequence_manager"):
+                self.sequence_manager = module.sequence_manager
+                break
+        if self.sequence_manager is None:
+            raise ValueError("The model is not a distributed petals model")
+        self.original_allowed_servers = self.sequence_manager.allowed_servers
+
+    def num_blocks(self):
+        return len(self.sequence_manager.block_uids)
+
+    def peers(self):
+        from petals.utils.dht import get_remote_module_infos
+
+        manager = self.sequence_manager
+        block_infos = get_remote_module_infos(manager.dht, manager.block_uids, latest=True)
+        peers = {}
+        for block_info in block_infos:
+            if block_info is None:
+                continue
+            for peer_id, server_info in block_info.servers.items():
+                if peer_id in peers or server_info.start_block is None:
+                    continue
+                peers[peer_id] = PeerInfo(peer_id, server_info.start_block, server_info.end_block, server_info.inference_rps)
+        return list(peers.values())
+
+    def probe(self, peer_id):
+        aggregator = self.sequence_manager.ping_aggregator
+        aggregator.ping([peer_id])
+        rtt = aggregator.to_dict().get(peer_id)
+        if rtt is None or rtt == float("inf"):
+            return None
+        return rtt
+
+    def apply_route(self, route):
+        """
+        Make the model use the peers of a route.
+
+        Args:
+            route (Route): The route, None to give the model back its original servers.
+        """
+        if route is None:
+            self.sequence_manager.allowed_servers = self.original_allowed_servers
+        else:
+            self.sequence_manager.allowed_servers = set(route.peer_ids())
+        self.sequence_manager.update(wait=True)
+
+
+class RouteSelector:
+    """
+    Picks and maintains the lowest latency route through a peer source.
+
+    Attributes:
+        source: The peer source, SimulatedPeerSource or PetalsPeerSource.
+        smoothing (float): The weight of a new probe in the moving average of a peer's round trip time.
+        degrade_factor (float): How many times slower than when it was picked a peer must get to trigger a new route.
+        route (Route): The current route, None until one is picked.
+        decisions (list): The (time, message) log of the route decisions.
+    """
+
+    def __init__(self, source, smoothing=0.3, degrade_factor=2.0, max_decisions=50):
+        self.source = source
+        self.smoothing = smoothing
+        self.degrade_factor = degrade_factor
+        self.max_decisions = max_decisions
+        self.rtts = {}
+        self.peers_by_id = {}
+        self.route = None
+        self.baseline = {}
+        self.decisions = []
+
+    def log(self, message):
+        self.decisions.append((time.time(), message))
+        del self.decisions[:-self.max_decisions]
+
+    def observe(self, peer_id, rtt):
+        """
+        Add a round trip time measurement to the moving average of a peer.
+
+        Args:
+            peer_id: The peer identifier.
+            rtt (float): The measured round trip time in seconds, None if the peer did not answer.
+        """
+        if rtt is None:
+            self.rtts[peer_id] = None
+        elif self.rtts.get(peer_id) is None:
+            self.rtts[peer_id] = rtt
+        else:
+            self.rtts[peer_id] = self.smoothing * rtt + (1 - self.smoothing) * self.rtts[peer_id]
+
+    def probe(self, peer_ids):
+        """
+        Probe peers and update their moving averages.
+
+        Args:
+            peer_ids (list): The peers to probe.
+
+        Returns:
+            float: The time the probes took in seconds.
+        """
+        start = time.monotonic()
+        for peer_id in peer_ids:
+            try:
+                rtt = self.source.probe(peer_id)
+            except Exception:
+                rtt = None
+            self.observe(peer_id, rtt)
+        return time.monotonic() - start
+
+    def best_route(self, peers, num_blocks):
+        """
+        Find the route with the lowest estimated step time.
+
+        A peer may be entered at any block it serves and left at any later block it serves, the cost of a hop is the
+        round trip time to the peer plus the number of blocks it runs divided by its inference speed.
+
+        Args:
+            peers (list): The candidate PeerInfo.
+            num_blocks (int): The number of blocks of the model.
+
+        Returns:
+            Route: The best route, None if the reachable peers do not cover every block.
+        """
+        best = [float("inf")] * (num_blocks + 1)
+        previous = [None] * (num_blocks + 1)
+        best[0] = 0.0
+        for block in range(num_blocks):
+            if best[block] == float("inf"):
+                continue
+            for peer in peers:
+                rtt = self.rtts.get(peer.peer_id)
+                if rtt is None or not peer.start <= block < peer.end:
+                    continue
+                for exit_block in range(block + 1, min(peer.end, num_blocks) + 1):
+                    cost = best[block] + rtt + (exit_block - block) / peer.inference_rps
+                    if cost < best[exit_block]:
+                        best[exit_block] = cost
+                        previous[exit_block] = (block, peer.peer_id)
+        if best[num_blocks] == float("inf"):
+            return None
+        hops = []
+        block = num_blocks
+        while block > 0:
+            start, peer_id = previous[block]
+            hops.append((peer_id, start, block))
+            block = start
+        return Route(list(reversed(hops)), best[num_blocks])
+
+    def select(self, reason="initial selection"):
+        """
+        Probe every candidate peer and switch to the best route.
+
+        Args:
+            reason (str): Why a route is picked, for the decision log.
+
+        Returns:
+            Route: The new route, None if no route covers every block. The previous route is then released, since it
+            may go through the peer that made it fail.
+        """
+        peers = self.source.peers()
+        self.peers_by_id = {peer.peer_id: peer for peer in peers}
+        probe_time = self.probe(list(self.peers_by_id))
+        route = self.best_route(peers, self.source.num_blocks())
+        if route is None:
+            self.log(f"No route covers every block ({len(peers)} peers probed in {probe_time:.2f}s)")
+            self.release()
+            return None
+        self.route = route
+        self.baseline = {peer_id: self.rtts[peer_id] for peer_id in route.peer_ids()}
+        self.source.apply_route(route)
+        self.log(f"{reason}: {route.describe()}, {len(peers)} peers probed in {probe_time:.2f}s")
+        return route
+
+    def release(self):
+        """
+        Drop the current route and let the model pick its servers by itself again.
+        """
+        if self.route is None:
+            return
+        self.route = None
+        self.baseline = {}
+        self.source.apply_route(None)
+
+    def check(self):
+        """
+        Probe the peers of the current route and pick a new route if one of them degraded.
+
+        Returns:
+            bool: True if a new route was picked.
+        """
+        if self.route is None:
+            return self.select() is not None
+        self.probe(self.route.peer_ids())
+        for peer_id in self.route.peer_ids():
+            rtt = self.rtts.get(peer_id)
+            if rtt is None:
+                return self.select(f"re-routed, {str(peer_id)[-8:]} is unreachable") is not None
+            if rtt > self.degrade_factor * self.baseline[peer_id]:
+                reason = f"re-routed, {str(peer_id)[-8:]} went from {self.baseline[peer_id] * 1000:.0f} to {rtt * 1000:.0f} ms"
+                return self.select(reason) is not None
+        return False
+
+    def describe(self):
+        """
+        Build a human readable report of the current route and of the recent decisions.
+
+        Returns:
+            str: The multi-line report.
+        """
+        text = f"Current route: {self.route.describe() if self.route else 'none'}\n"
+        if self.route:
+            for peer_id, start, end in self.route.hops:
+                rtt = self.rtts.get(peer_id)
+                rtt = "unreachable" if rtt is None else f"{rtt * 1000:.0f} ms"
+                text += f"  blocks [{start}:{end}) on {peer_id}: rtt {rtt}\n"
+        for timestamp, message in reversed(self.decisions):
+            text += f"{time.strftime('%H:%M:%S', time.localtime(timestamp))} {message}\n"
+        return text
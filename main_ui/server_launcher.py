@@ -0,0 +1,391 @@
+"""
+    Petals Server Installer - Server launcher
+
+    Author: ParisNeo
+    Version: 1.0.0
+    Description: Starts petals servers from a warm, pre-imported interpreter.
+
+    Importing torch, transformers and petals takes a long time. Run with --zygote, this script imports them once and
+    then waits for commands on its standard input, forking a new server for every start. Restarting a server after a
+    configuration change or a crash then skips the imports entirely. Run with --cold, it imports and runs a single
+    server, which is used where fork is not available.
+
+    Commands are JSON lines: {"cmd": "start", "argv": [...]}, {"cmd": "stop"} and {"cmd": "quit"}. The launcher
+    reports on its standard output with messages starting with MARKER: every start is answered with "started pid=..." or
+    "error ...", and every server that stops is reported with "exited code=...". A start received while the previous
+    server is still shutting down is queued and forked as soon as that server has exited.
+"""
+import json
+import os
+import re
+import select
+import signal
+import sys
+import time
+import traceback
+
+# Prefix of the lines printed by the launcher itself
+MARKER = "[launcher]"
+
+# Petals log lines marking the end of the block loading and the announcement of the server
+BLOCK_LOADED_PATTERN = re.compile(r"Loaded .*block", re.IGNORECASE)
+ANNOUNCED_PATTERN = re.compile(r"\bStarted\b|are online|will appear at")
+# Hivemind logs the multiaddrs of the server itself as "Running a server on ['/ip4/.../p2p/<peer id>', ...]"
+OWN_ADDRESS_PATTERN = re.compile(r"Running a server on .*?/p2p/(\w+)")
+
+
+def can_fork():
+    """
+    Check whether servers can be forked from a warm launcher on this system.
+
+    Returns:
+        bool: True if os.fork is available.
+    """
+    return hasattr(os, "fork")
+
+
+def parse_own_peer_id(line):
+    """
+    Find the peer id of the local server in a line of its output.
+
+    Only the line announcing the server's own addresses is used: other lines may mention the multiaddrs of other
+    peers, e.g. bootstrap peers or connection errors.
+
+    Args:
+        line (str): The output line.
+
+    Returns:
+        str: The peer id, None if the line does not announce the server's addresses.
+    """
+    match = OWN_ADDRESS_PATTERN.search(line)
+    return match.group(1) if match else None
+
+
+def emit(message):
+    """
+    Print a launcher message and flush it so that the UI sees it immediately.
+
+    The message and its newline are written at once, so that the output of the server cannot end up between them.
+
+    Args:
+        message (str): The message to print.
+    """
+    sys.stdout.write(f"{MARKER} {message}\n")
+    sys.stdout.flush()
+
+
+def launcher_message(line):
+    """
+    Find a launcher message in a line of output.
+
+    The message is looked for anywhere in the line: a server killed while printing leaves an unfinished line, which
+    the next launcher message completes.
+
+    Args:
+        line (str): The output line.
+
+    Returns:
+        str: The message without MARKER, None if the line holds no launcher message.
+    """
+    position = line.find(MARKER)
+    if position < 0:
+        return None
+    return line[position + len(MARKER):].strip()
+
+
+def import_server_modules():
+    """
+    Import the modules needed to run a petals server.
+
+    Returns:
+        tuple: The run_server module and the time the imports took in seconds.
+    """
+    start = time.monotonic()
+    import torch  # noqa: F401
+    import transformers  # noqa: F401
+    import petals  # noqa: F401
+    from petals.cli import run_server
+    return run_server, time.monotonic() - start
+
+
+def run_server_main(run_server, argv):
+    """
+    Run a petals server in the current process.
+
+    Args:
+        run_server: The petals.cli.run_server module.
+        argv (list): The server arguments, without the program name.
+
+    Returns:
+        int: The exit code of the server.
+    """
+    sys.argv = ["petals.cli.run_server"] + list(argv)
+    try:
+        run_server.main()
+        return 0
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else 0
+    except KeyboardInterrupt:
+        return 0
+    except BaseException:
+        traceback.print_exc()
+        return 1
+
+
+def fork_server(run_server, argv):
+    """
+    Fork a server process from the warm launcher.
+
+    The child gets its own process group so that stopping it also stops the helper processes it spawns.
+
+    Args:
+        run_server: The petals.cli.run_server module.
+        argv (list): The server arguments, without the program name.
+
+    Returns:
+        int: The pid of the child process.
+    """
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            os.setpgid(0, 0)
+            # Commands are meant for the launcher, not for the server
+            devnull = os.open(os.devnull, os.O_RDONLY)
+            os.dup2(devnull, sys.stdin.fileno())
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            code = run_server_main(run_server, argv)
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+    # Also set from the parent, so that a stop handled before the child got to run still reaches its group
+    try:
+        os.setpgid(pid, pid)
+    except (PermissionError, ProcessLookupError):
+        # The child already did it and ran exec, or it already exited
+        pass
+    return pid
+
+
+def stop_server(pid):
+    """
+    Ask a forked server and its process group to stop.
+
+    Args:
+        pid (int): The pid of the server process.
+    """
+    try:
+        os.killpg(pid, signal.SIGTERM)
+    except ProcessLookupError:
+        # The process is not leading its group (yet), signal it alone
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+
+def zygote_main():
+    """
+    Run the warm launcher loop until the UI asks it to quit or closes its standard input.
+    """
+    run_server, import_time = import_server_modules()
+    emit(f"ready import_time={import_time:.3f}")
+
+    child = None
+    stopping = False
+    # The arguments of a start received while the previous server was shutting down
+    queued_argv = None
+    pending = b""
+    while True:
+        if child is not None:
+            pid, status = os.waitpid(child, os.WNOHANG)
+            if pid:
+                emit(f"exited code={os.waitstatus_to_exitcode(status)}")
+                child = None
+                stopping = False
+        if child is None and queued_argv is not None:
+            child = fork_server(run_server, queued_argv)
+            queued_argv = None
+            emit(f"started pid={child}")
+
+        if b"\n" not in pending:
+            readable, _, _ = select.select([sys.stdin], [], [], 0.5)
+            if not readable:
+                continue
+            data = os.read(sys.stdin.fileno(), 4096)
+            if not data:
+                # The UI went away
+                if child is not None:
+                    stop_server(child)
+                break
+            pending += data
+            continue
+        line, pending = pending.split(b"\n", 1)
+        try:
+            command = json.loads(line)
+        except ValueError:
+            emit(f"error invalid command {line.strip()!r}")
+            continue
+
+        if command.get("cmd") == "start":
+            if child is None:
+                child = fork_server(run_server, command.get("argv", []))
+                emit(f"started pid={child}")
+            elif stopping:
+                queued_argv = command.get("argv", [])
+            else:
+                emit("error a server is already running")
+        elif command.get("cmd") == "stop":
+            if queued_argv is not None:
+                queued_argv = None
+                emit("error the queued start was cancelled")
+            elif child is not None:
+                stop_server(child)
+                stopping = True
+            else:
+                emit("error no server is running")
+        elif command.get("cmd") == "quit":
+            if child is not None:
+                stop_server(child)
+                os.waitpid(child, 0)
+            break
+        else:
+            emit(f"error unknown command {command.get('cmd')!r}")
+
+
+def cold_main(argv):
+    """
+    Import the server modules and run a single server in this process.
+
+    Args:
+        argv (list): The server arguments, without the program name.
+
+    Returns:
+        int: The exit code of the server.
+    """
+    run_server, import_time = import_server_modules()
+    emit(f"ready import_time={import_time:.3f}")
+    emit(f"started pid={os.getpid()}")
+    code = run_server_main(run_server, argv)
+    emit(f"exited code={code}")
+    return code
+
+
+def command_line(cmd, argv=None):
+    """
+    Build a command line for the warm launcher.
+
+    Args:
+        cmd (str): The command name, "start", "stop" or "quit".
+        argv (list): The server arguments for the "start" command.
+
+    Returns:
+        bytes: The encoded JSON line.
+    """
+    command = {"cmd": cmd}
+    if argv is not None:
+        command["argv"] = list(argv)
+    return (json.dumps(command) + "\n").encode("utf-8")
+
+
+class LaunchTimer:
+    """
+    Measures the phases of a server start from the launcher and server output.
+
+    The phases are the imports (zero when the launcher was already warm), the block loading (from the fork until the
+    last "Loaded ... block" line) and the announcement (until the server reports it is started).
+
+    Attributes:
+        warm (bool): True if the launcher had already imported the server modules.
+        import_time (float): The import time in seconds, None until known.
+        block_load_time (float): The block loading time in seconds, None until known.
+        announce_time (float): The announcement time in seconds, None until known.
+        done (bool): True once the server has announced itself.
+    """
+
+    def __init__(self, warm=False):
+        """
+        Initialize a LaunchTimer instance. The clock starts immediately.
+
+        Args:
+            warm (bool): True if the launcher has already imported the server modules.
+        """
+        self.warm = warm
+        self.start_time = time.monotonic()
+        self.import_time = 0.0 if warm else None
+        self.started_time = None
+        self.loaded_time = None
+        self.block_load_time = None
+        self.announce_time = None
+        self.done = False
+
+    def feed(self, line, now=None):
+        """
+        Process a line of output.
+
+        Args:
+            line (str): The output line.
+            now (float): The time the line was received, defaults to time.monotonic().
+
+        Returns:
+            bool: True if this line completed the measurement.
+        """
+        if self.done:
+            return False
+        now = time.monotonic() if now is None else now
+        message = launcher_message(line)
+        if message is not None:
+            match = re.search(r"import_time=([\d.]+)", message)
+            if match and self.import_time is None:
+                self.import_time = float(match.group(1))
+            if message.startswith("started pid="):
+                self.started_time = now
+            return False
+        if self.started_time is None:
+            return False
+        if BLOCK_LOADED_PATTERN.search(line):
+            self.loaded_time = now
+        elif ANNOUNCED_PATTERN.search(line):
+            loaded_time = self.loaded_time if self.loaded_time is not None else now
+            self.block_load_time = loaded_time - self.started_time
+            self.announce_time = now - loaded_time
+            self.done = True
+            return True
+        return False
+
+    def total_time(self):
+        """
+        Get the time from the start request until now or until the announcement.
+
+        Returns:
+            float: The elapsed time in seconds.
+        """
+        if self.done:
+            return self.started_time + self.block_load_time + self.announce_time - self.start_time
+        return time.monotonic() - self.start_time
+
+    def describe(self):
+        """
+        Build a one line summary of the start timings.
+
+        Returns:
+            str: The summary.
+        """
+        def fmt(value):
+            return "?" if value is None else f"{value:.1f}s"
+        mode = "warm" if self.warm else "cold"
+        return (
+            f"{MARKER} Start timings ({mode}): import {fmt(self.import_time)}, block load {fmt(self.block_load_time)}, "
+            f"announce {fmt(self.announce_time)}, total {self.total_time():.1f}s"
+        )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--zygote":
+        zygote_main()
+    elif len(sys.argv) > 1 and sys.argv[1] == "--cold":
+        sys.exit(cold_main(sys.argv[2:]))
+    else:
+        print(f"usage: {sys.argv[0]} --zygote | --cold <server arguments>")
+        sys.exit(2)
@@ -0,0 +1,91 @@
+#!/bin/bash
+# Build a reusable offline bundle for install_script.sh --offline
+#
+# Usage: ./build_bundle.sh [bundle_dir]
+#
+# Run it once, inside the petals conda environment (the wheels are built for its Python 3.10),
+# then copy the bundle to every machine and run: ./install_script.sh --offline <bundle_dir>
+# Running it again only fetches what is missing from the bundle.
+set -e
+
+BUNDLE=$(realpath -m "${1:-$HOME/petals_bundle}")
+PYTHON=${PYTHON:-python}
+
+MINICONDA_URL=https://repo.anaconda.com/miniconda/Miniconda3-py310_23.5.2-0-Linux-x86_64.sh
+CUDA_REPO_URL=https://developer.download.nvidia.com/compute/cuda/12.2.2/local_installers/cuda-repo-wsl-ubuntu-12-2-local_12.2.2-1_amd64.deb
+PETALS_URL=git+https://github.com/bigscience-workshop/petals
+INSTALLER_URL=https://github.com/ParisNeo/petals_server_installer.git
+# Every Python package the server UI needs, petals brings torch, transformers and hivemind
+PACKAGES="$PETALS_URL pyyaml psutil PyQt5 PyQtWebEngine"
+DEBS="libxcursor1"
+
+if ! "$PYTHON" -c 'import sys; sys.exit(sys.version_info[:2] != (3, 10))'; then
+    echo "The wheels must be built with Python 3.10, activate the petals conda environment or set PYTHON"
+    exit 1
+fi
+
+mkdir -p "$BUNDLE/downloads" "$BUNDLE/debs" "$BUNDLE/wheelhouse"
+
+# Download a file unless the bundle already has it, resuming partial downloads
+download() {
+    if [ -s "$2" ]; then
+        echo "Already in the bundle: $(basename "$2")"
+        return 0
+    fi
+    echo "Downloading $(basename "$2")"
+    wget -q -c "$1" -O "$2.part" && mv "$2.part" "$2"
+}
+
+# Build the wheels of the packages and of all their dependencies.
+# They are resolved together so that the wheelhouse holds a single consistent version of each package.
+build_wheels() {
+    if [ "$(cat "$BUNDLE/wheelhouse.done" 2>/dev/null)" == "$PACKAGES" ]; then
+        echo "Already in the bundle: wheels"
+        return 0
+    fi
+    echo "Building wheels"
+    # Start from an empty wheelhouse so that older versions do not end up in the lock file
+    rm -f "$BUNDLE"/wheelhouse/*.whl
+    "$PYTHON" -m pip wheel -q -w "$BUNDLE/wheelhouse" $PACKAGES > "$BUNDLE/wheelhouse.log" 2>&1 && echo "$PACKAGES" > "$BUNDLE/wheelhouse.done"
+}
+
+# Independent artifacts are fetched in parallel, the wheels while Miniconda and CUDA download
+pids=()
+download "$MINICONDA_URL" "$BUNDLE/downloads/miniconda.sh" & pids+=($!)
+download "$CUDA_REPO_URL" "$BUNDLE/downloads/cuda-repo.deb" & pids+=($!)
+build_wheels & pids+=($!)
+(cd "$BUNDLE/debs" && for deb in $DEBS $(apt-cache depends $DEBS | awk '/ Depends:/ {print $2}'); do
+    ls "${deb}"_*.deb > /dev/null 2>&1 || apt-get download "$deb" > /dev/null
+done) & pids+=($!)
+if [ ! -d "$BUNDLE/petals_server_installer" ]; then
+    git clone -q "$INSTALLER_URL" "$BUNDLE/petals_server_installer" & pids+=($!)
+fi
+
+failed=0
+for pid in "${pids[@]}"; do
+    wait "$pid" || failed=1
+done
+if [ $failed -ne 0 ]; then
+    echo "Some artifacts could not be fetched, see $BUNDLE/wheelhouse.log and run the script again"
+    exit 1
+fi
+
+# Pin every wheel by its hash so that the offline install only accepts these exact files
+echo "Writing requirements.lock"
+"$PYTHON" - "$BUNDLE/wheelhouse" > "$BUNDLE/requirements.lock" <<'EOF'
+import hashlib
+import sys
+from pathlib import Path
+from pip._vendor.packaging.utils import canonicalize_name, parse_wheel_filename
+
+for path in sorted(Path(sys.argv[1]).glob("*.whl")):
+    name, version, _, _ = parse_wheel_filename(path.name)
+    digest = hashlib.sha256(path.read_bytes()).hexdigest()
+    print(f"{canonicalize_name(name)}=={version} --hash=sha256:{digest}")
+EOF
+
+echo "Writing SHA256SUMS"
+(cd "$BUNDLE" && sha256sum downloads/* debs/*.deb wheelhouse/*.whl requirements.lock > SHA256SUMS)
+
+echo "Bundle ready in $BUNDLE ($(du -sh "$BUNDLE" | cut -f1))"
+echo "Install with: ./install_script.sh --offline $BUNDLE"
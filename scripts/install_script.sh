@@ -1,59 +1,141 @@
 #!/bin/bash
+#
+# Usage: ./install_script.sh [--offline <bundle_dir>] [--index-url <url>]
+#
+#   --offline <bundle_dir>  install everything from a bundle made by build_bundle.sh, without network access
+#   --index-url <url>       install the Python packages from a local package index instead of PyPI and GitHub
+#
+# Steps whose result is already present (Miniconda, the conda environment, CUDA) are skipped,
+# so the script can be run again after a failure.
 
-# Update and upgrade packages
-sudo apt update
-sudo apt upgrade -y
-# Add a repository for Python 3.10
-sudo add-apt-repository ppa:deadsnakes/ppa -y
-sudo apt update
+OFFLINE_DIR=""
+INDEX_URL=""
+while [ $# -gt 0 ]; do
+    case "$1" in
+        --offline) OFFLINE_DIR=$(realpath "$2"); shift 2 ;;
+        --index-url) INDEX_URL=$2; shift 2 ;;
+        *) echo "Unknown option $1"; exit 1 ;;
+    esac
+done
 
-# Install Python 3.10 and pip
-sudo apt install python3.10 python3-pip -y
-# Create symlinks for python and pip
-sudo ln -s /usr/bin/python3.10 /usr/local/bin/python
-sudo ln -s /usr/bin/pip3 /usr/local/bin/pip
+MINICONDA_URL=https://repo.anaconda.com/miniconda/Miniconda3-latest-Linux-x86_64.sh
+
+# Append a line to ~/.bashrc unless it is already there
+add_to_bashrc() {
+    grep -qxF "$1" ~/.bashrc || echo "$1" >> ~/.bashrc
+}
+
+if [ -n "$OFFLINE_DIR" ]; then
+    # Check the bundle before installing anything from it
+    echo "Verifying the bundle"
+    (cd "$OFFLINE_DIR" && sha256sum --quiet -c SHA256SUMS) || { echo "The bundle is corrupted"; exit 1; }
+    sudo apt-get install -y --no-download "$OFFLINE_DIR"/debs/*.deb
+else
+    # Start downloading Miniconda while apt is busy
+    if [ ! -d ~/miniconda ]; then
+        wget -q "$MINICONDA_URL" -O ~/miniconda.sh &
+        MINICONDA_PID=$!
+    fi
+
+    # Update and upgrade packages
+    sudo apt update
+    sudo apt upgrade -y
+    # Add a repository for Python 3.10
+    sudo add-apt-repository ppa:deadsnakes/ppa -y
+    sudo apt update
+
+    # Install Python 3.10 and pip
+    sudo apt install python3.10 python3-pip -y
+    # Create symlinks for python and pip
+    [ -e /usr/local/bin/python ] || sudo ln -s /usr/bin/python3.10 /usr/local/bin/python
+    [ -e /usr/local/bin/pip ] || sudo ln -s /usr/bin/pip3 /usr/local/bin/pip
+fi
 
 # Install Miniconda
-wget https://repo.anaconda.com/miniconda/Miniconda3-latest-Linux-x86_64.sh -O ~/miniconda.sh
-bash ~/miniconda.sh -b -p ~/miniconda
-rm ~/miniconda.sh
+if [ -d ~/miniconda ]; then
+    echo "Miniconda is already installed"
+else
+    if [ -n "$OFFLINE_DIR" ]; then
+        cp "$OFFLINE_DIR/downloads/miniconda.sh" ~/miniconda.sh
+    else
+        wait $MINICONDA_PID
+    fi
+    bash ~/miniconda.sh -b -p ~/miniconda
+    rm ~/miniconda.sh
+fi
 source ~/miniconda/etc/profile.d/conda.sh
 #make it permanant
-echo 'source ~/miniconda/etc/profile.d/conda.sh' >> ~/.bashrc
+add_to_bashrc 'source ~/miniconda/etc/profile.d/conda.sh'
 
 # Create and activate conda environment
-echo Making petals conda environment
-conda create --name petals python=3.10 pip -y
+if conda env list | grep -q "^petals "; then
+    echo "The petals conda environment already exists"
+elif [ -n "$OFFLINE_DIR" ]; then
+    # The bundled Miniconda comes with Python 3.10, its base environment is cloned from the local package cache
+    echo Making petals conda environment
+    conda create --name petals --clone base --offline -y
+else
+    echo Making petals conda environment
+    conda create --name petals python=3.10 pip -y
+fi
 conda activate petals
 
 # install cuda
-wget https://developer.download.nvidia.com/compute/cuda/repos/wsl-ubuntu/x86_64/cuda-wsl-ubuntu.pin
-sudo mv cuda-wsl-ubuntu.pin /etc/apt/preferences.d/cuda-repository-pin-600
-sudo apt-key adv --fetch-keys https://developer.download.nvidia.com/compute/cuda/repos/wsl-ubuntu/x86_64/3bf863cc.pub
-sudo add-apt-repository "deb https://developer.download.nvidia.com/compute/cuda/repos/wsl-ubuntu/x86_64/ /"
-sudo apt-get update
-sudo apt-get -y install cuda
+if [ -x /usr/local/cuda/bin/nvcc ]; then
+    echo "CUDA is already installed"
+elif [ -n "$OFFLINE_DIR" ]; then
+    # The local repository package holds every CUDA package and its signing key
+    sudo dpkg -i "$OFFLINE_DIR/downloads/cuda-repo.deb"
+    sudo cp /var/cuda-repo-wsl-ubuntu-12-2-local/cuda-*-keyring.gpg /usr/share/keyrings/
+    sudo apt-get update -o Dir::Etc::sourcelist=/etc/apt/sources.list.d/cuda-wsl-ubuntu-12-2-local.list -o Dir::Etc::sourceparts=- -o APT::Get::List-Cleanup=0
+    sudo apt-get -y --no-download install cuda
+else
+    wget https://developer.download.nvidia.com/compute/cuda/repos/wsl-ubuntu/x86_64/cuda-wsl-ubuntu.pin
+    sudo mv cuda-wsl-ubuntu.pin /etc/apt/preferences.d/cuda-repository-pin-600
+    sudo apt-key adv --fetch-keys https://developer.download.nvidia.com/compute/cuda/repos/wsl-ubuntu/x86_64/3bf863cc.pub
+    sudo add-apt-repository "deb https://developer.download.nvidia.com/compute/cuda/repos/wsl-ubuntu/x86_64/ /"
+    sudo apt-get update
+    sudo apt-get -y install cuda
+fi
 # Add cuda to the path
 export PATH=/usr/local/cuda/bin:$PATH
 #make it permanant
-echo 'export PATH=/usr/local/cuda/bin:$PATH' >> ~/.bashrc
+add_to_bashrc 'export PATH=/usr/local/cuda/bin:$PATH'
 export LD_LIBRARY_PATH=/usr/local/cuda-12.2/targets/x86_64-linux/lib/:$LD_LIBRARY_PATH
 #make it permanant
-echo "export LD_LIBRARY_PATH=/usr/local/cuda-12.2/targets/x86_64-linux/lib/:$LD_LIBRARY_PATH" >> ~/.bashrc
-# Install petals
-echo "Installing petals"
-pip install --upgrade git+https://github.com/bigscience-workshop/petals
-pip install --upgrade pyyaml
-
-echo "Installing PyQt5"
-pip install PyQt5
-echo "Installing PyQt5 Web engine"
-pip install PyQtWebEngine
-sudo apt-get install libxcursor1
-
-echo cloning petals-server-installer
+add_to_bashrc 'export LD_LIBRARY_PATH=/usr/local/cuda-12.2/targets/x86_64-linux/lib/:$LD_LIBRARY_PATH'
+
+if [ -n "$OFFLINE_DIR" ]; then
+    # Only the hash pinned wheels of the bundle are accepted
+    echo "Installing petals, PyQt5 and PyQt5 Web engine from the bundle"
+    pip install --no-index --find-links "$OFFLINE_DIR/wheelhouse" --require-hashes -r "$OFFLINE_DIR/requirements.lock"
+elif [ -n "$INDEX_URL" ]; then
+    echo "Installing petals, PyQt5 and PyQt5 Web engine from $INDEX_URL"
+    pip install --index-url "$INDEX_URL" petals pyyaml psutil PyQt5 PyQtWebEngine
+    sudo apt-get install libxcursor1
+else
+    # Install petals
+    echo "Installing petals"
+    pip install --upgrade git+https://github.com/bigscience-workshop/petals
+    pip install --upgrade pyyaml
+
+    echo "Installing PyQt5"
+    pip install PyQt5
+    echo "Installing PyQt5 Web engine"
+    pip install PyQtWebEngine
+    sudo apt-get install libxcursor1
+fi
+
 cd ~
-git clone https://github.com/ParisNeo/petals_server_installer.git
+if [ -d ~/petals_server_installer ]; then
+    echo "petals-server-installer is already there"
+elif [ -n "$OFFLINE_DIR" ]; then
+    echo copying petals-server-installer
+    cp -r "$OFFLINE_DIR/petals_server_installer" ~/petals_server_installer
+else
+    echo cloning petals-server-installer
+    git clone https://github.com/ParisNeo/petals_server_installer.git
+fi
 cd ~/petals_server_installer
 # Exit WSL
 exit
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The UI modules import each other as top level modules, like petals_server.py does when it is run
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "main_ui"))
@@ -0,0 +1,169 @@
+import hashlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from cache_manager import CacheManager, format_block_ranges, parse_block_range, parse_served_blocks
+
+COMMIT = "c" * 40
+
+
+def make_model_files():
+    # Six blocks, two per shard, and the embeddings in the first shard
+    shards = {f"model-{i:05d}-of-00003.safetensors": bytes([i]) * 4096 for i in range(1, 4)}
+    weight_map = {f"model.layers.{block}.mlp.weight": f"model-{block // 2 + 1:05d}-of-00003.safetensors" for block in range(6)}
+    weight_map["model.embed_tokens.weight"] = "model-00001-of-00003.safetensors"
+    files = dict(shards)
+    files["model.safetensors.index.json"] = json.dumps({"weight_map": weight_map}).encode()
+    return files
+
+
+class StandInHub:
+    """
+    A local server answering the hub's resolve requests with the headers huggingface_hub relies on.
+
+    Shards are served like LFS files (their etag is their sha256), the index like a regular git file.
+    """
+
+    def __init__(self, models):
+        self.models = models
+        self.corrupted = set()
+        self.downloads = []
+        hub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def respond(self, send_body):
+                # /<org>/<name>/resolve/<revision>/<file>
+                parts = self.path.split("?")[0].strip("/").split("/")
+                model_name, filename = "/".join(parts[:2]), "/".join(parts[4:])
+                data = hub.models.get(model_name, {}).get(filename)
+                if data is None:
+                    self.send_response(404)
+                    self.send_header("X-Error-Code", "EntryNotFound")
+                    self.send_header("X-Repo-Commit", COMMIT)
+                    self.end_headers()
+                    return
+                lfs = filename.endswith(".safetensors")
+                if lfs:
+                    etag = hashlib.sha256(data).hexdigest()
+                else:
+                    etag = hashlib.sha1(f"blob {len(data)}\0".encode() + data).hexdigest()
+                if filename in hub.corrupted:
+                    data = bytes(len(data))
+                self.send_response(200)
+                self.send_header("X-Repo-Commit", COMMIT)
+                self.send_header("ETag", f'"{etag}"')
+                if lfs:
+                    self.send_header("X-Linked-Etag", f'"{etag}"')
+                    self.send_header("X-Linked-Size", str(len(data)))
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                if send_body:
+                    hub.downloads.append(filename)
+                    self.wfile.write(data)
+
+            def do_HEAD(self):
+                self.respond(False)
+
+            def do_GET(self):
+                self.respond(True)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.endpoint = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def hub():
+    hub = StandInHub({"org/model": make_model_files(), "org/other": make_model_files()})
+    yield hub
+    hub.server.shutdown()
+
+
+@pytest.fixture
+def manager(hub, tmp_path):
+    return CacheManager(tmp_path / "cache", endpoint=hub.endpoint, token=False)
+
+
+def test_block_range_helpers():
+    assert parse_block_range("0-3, 8,") == [0, 1, 2, 3, 8]
+    assert format_block_ranges([8, 0, 1, 2, 3, 10]) == "0-3, 8, 10"
+    assert format_block_ranges([]) == "none"
+    assert parse_served_blocks("Announced that blocks [3, 4, 5] are joining") == [3, 4, 5]
+    assert parse_served_blocks("Serving blocks 3:6") == [3, 4, 5]
+    assert parse_served_blocks("Started") is None
+
+
+def test_prestage_downloads_only_the_shards_of_the_blocks(manager, hub):
+    downloaded = manager.prestage("org/model", [2, 3])
+
+    assert downloaded == ["model-00002-of-00003.safetensors"]
+    assert manager.cached_blocks("org/model") == [2, 3]
+    # The regular hub cache layout, so that petals finds the files
+    model_dir = manager.model_dir("org/model")
+    assert (model_dir / "refs" / "main").read_text() == COMMIT
+    path = model_dir / "snapshots" / COMMIT / "model-00002-of-00003.safetensors"
+    assert path.is_symlink() and path.resolve().parent == model_dir / "blobs"
+
+
+def test_prestage_skips_cached_shards(manager, hub):
+    manager.prestage("org/model", [0, 1, 2])
+    hub.downloads.clear()
+
+    downloaded = manager.prestage("org/model", [0, 1, 2, 3, 4])
+
+    assert downloaded == ["model-00003-of-00003.safetensors"]
+    assert hub.downloads == ["model-00003-of-00003.safetensors"]
+    assert manager.cached_blocks("org/model") == [0, 1, 2, 3, 4, 5]
+
+
+def test_corrupted_download_is_deleted(manager, hub):
+    hub.corrupted.add("model-00002-of-00003.safetensors")
+
+    with pytest.raises(IOError, match="hash mismatch"):
+        manager.prestage("org/model", [2])
+
+    assert manager.cached_blocks("org/model") == []
+    assert not list((manager.model_dir("org/model") / "blobs").glob("*.incomplete"))
+    assert len(list((manager.model_dir("org/model") / "blobs").iterdir())) == 1  # Only the index is left
+
+    hub.corrupted.clear()
+    assert manager.prestage("org/model", [2]) == ["model-00002-of-00003.safetensors"]
+
+
+def test_verify_deletes_files_corrupted_on_disk(manager, hub):
+    manager.prestage("org/model", [0, 1, 2, 3])
+    assert manager.verify("org/model") == []
+
+    blob = (manager.snapshot_dir("org/model") / "model-00001-of-00003.safetensors").resolve()
+    with open(blob, "r+b") as blob_file:
+        blob_file.write(b"bad")
+
+    assert manager.verify("org/model") == ["model-00001-of-00003.safetensors"]
+    assert not blob.exists()
+    assert manager.cached_blocks("org/model") == [2, 3]
+    # The next pre-staging downloads it again instead of relinking the corrupted blob
+    assert manager.prestage("org/model", [0]) == ["model-00001-of-00003.safetensors"]
+    assert manager.verify("org/model") == []
+
+
+def test_enforce_quota_evicts_the_least_recently_used_model(manager, hub):
+    manager.prestage("org/model", [0, 1, 2, 3, 4, 5])
+    manager.prestage("org/other", [0, 1, 2, 3, 4, 5])
+    one_model = manager.model_size("org/model")
+    manager.quota_bytes = one_model + one_model // 2
+
+    # org/model was used first, but it is the one being served
+    assert manager.enforce_quota(keep="org/model") == ["org/other"]
+    assert manager.cached_models() == ["org/model"]
+    assert manager.enforce_quota() == []
+
+    manager.quota_bytes = 1
+    assert manager.enforce_quota(keep="org/model") == []
+    assert manager.enforce_quota() == ["org/model"]
+    assert manager.cached_models() == []
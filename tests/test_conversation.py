@@ -0,0 +1,80 @@
+import pytest
+
+from conversation import MIN_PROMPT_BUDGET, Conversation, split_context
+
+TEMPLATE = "{system_prompt}### User: {message}\n\n### Assistant:\n"
+
+
+class FakeTokenizer:
+    """A whitespace tokenizer that adds a single <s> token to full prompts."""
+
+    def __init__(self):
+        self.words = ["<s>"]
+
+    def __call__(self, text, add_special_tokens=True):
+        ids = [0] if add_special_tokens else []
+        for word in text.split():
+            if word not in self.words:
+                self.words.append(word)
+            ids.append(self.words.index(word))
+        return {"input_ids": ids}
+
+    def decode(self, ids, skip_special_tokens=False):
+        return " ".join(self.words[i] for i in ids if not (skip_special_tokens and i == 0))
+
+
+def words(prefix, count):
+    return " ".join(f"{prefix}{i}" for i in range(count))
+
+
+def test_split_context_keeps_prompt_and_answer_within_the_context():
+    assert split_context(2048, 1024) == (1024, 1024)
+    assert split_context(4096, 100) == (3996, 100)
+    # max_new_tokens is reduced rather than going below the minimum prompt budget
+    assert split_context(1000, 990) == (MIN_PROMPT_BUDGET, 1000 - MIN_PROMPT_BUDGET)
+    # Contexts shorter than twice the minimum are shared equally
+    assert split_context(100, 1024) == (50, 50)
+    for context_length in [1, 10, 64, 100, 2048]:
+        for max_new_tokens in [1, 50, 5000]:
+            prompt_budget, new_tokens = split_context(context_length, max_new_tokens)
+            assert prompt_budget >= 0 and 0 < new_tokens <= max_new_tokens
+            assert prompt_budget + new_tokens <= context_length
+
+
+def test_history_is_kept_and_oldest_turns_dropped():
+    tokenizer = FakeTokenizer()
+    conversation = Conversation(tokenizer, TEMPLATE, "You are helpful. ", 40)
+
+    prompt = conversation.build_prompt("hello there")
+    assert prompt == "You are helpful. ### User: hello there\n\n### Assistant:\n"
+    conversation.add_answer(" hi! ")
+    prompt = conversation.build_prompt("how are you")
+    assert "### User: hello there\n\n### Assistant:\nhi!\n### User: how are you" in prompt
+    assert len(tokenizer(prompt)["input_ids"]) <= conversation.budget
+    conversation.add_answer("fine")
+
+    prompt = conversation.build_prompt(words("w", 20))
+    assert conversation.dropped_turns >= 1
+    assert "hello there" not in prompt
+    assert len(tokenizer(prompt)["input_ids"]) <= conversation.budget
+    assert "earlier turn(s) dropped" in conversation.transcript()
+
+
+def test_long_message_is_cut_from_the_start():
+    tokenizer = FakeTokenizer()
+    conversation = Conversation(tokenizer, TEMPLATE, "System. ", 30)
+
+    prompt = conversation.build_prompt(words("w", 100))
+
+    assert conversation.truncated_messages == 1
+    assert "w99" in prompt and "w0 " not in prompt
+    assert len(tokenizer(prompt)["input_ids"]) <= conversation.budget
+
+
+def test_system_prompt_larger_than_the_budget_is_reported():
+    tokenizer = FakeTokenizer()
+    conversation = Conversation(tokenizer, TEMPLATE, words("s", 50), 40)
+
+    with pytest.raises(ValueError, match="no room for the message"):
+        conversation.build_prompt("hello")
+    assert conversation.pending is None
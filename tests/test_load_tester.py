@@ -0,0 +1,38 @@
+from load_tester import LoadProfile, LoadTester, StubBackend, percentile
+
+
+def test_percentile_uses_nearest_rank():
+    assert percentile([], 0.5) is None
+    assert percentile([7], 0.99) == 7
+    assert percentile([2, 1], 0.5) == 1
+    assert percentile(list(range(1, 7)), 0.5) == 3
+    assert percentile(list(range(1, 8)), 0.5) == 4
+    assert percentile(list(range(1, 101)), 0.99) == 99
+    assert percentile(list(range(1, 101)), 0.07) == 7
+    assert percentile(list(range(1, 101)), 1.0) == 100
+
+
+def test_load_test_with_stub_backend():
+    profile = LoadProfile(sessions=4, requests_per_session=3, ramp_up=0.02, prompt_tokens=(4, 8), new_tokens=(2, 5), seed=1)
+    backend = StubBackend(prefill_latency=0.0001, token_latency=0.001)
+    progress = []
+    report = LoadTester(backend, profile, sample_interval=0.01).run(lambda done, total: progress.append((done, total)))
+
+    assert len(report.results) == 12
+    assert sorted(progress) == [(done, 12) for done in range(1, 13)]
+    assert {result.session for result in report.results} == {0, 1, 2, 3}
+    assert all(2 <= result.tokens <= 5 for result in report.results)
+    assert report.error_rate() == 0.0
+    assert report.throughput() > 0
+    assert "cpu" in report.resources and "memory" in report.resources
+    assert "Requests: 12, succeeded: 12" in report.describe()
+
+
+def test_load_test_reports_errors():
+    profile = LoadProfile(sessions=2, requests_per_session=2, prompt_tokens=(1, 1), new_tokens=(1, 1), seed=1)
+    report = LoadTester(StubBackend(prefill_latency=0, token_latency=0, error_rate=1.0), profile, sample_interval=0.01).run()
+
+    assert report.error_rate() == 1.0
+    assert report.throughput() == 0.0
+    assert report.latencies() == []
+    assert "RuntimeError: Simulated server error" in report.describe()
@@ -0,0 +1,96 @@
+import threading
+import time
+
+from model_registry import ModelRegistry
+
+
+class FakeLoader:
+    """Builds (model, tokenizer) tuples whose model is the memory it takes, optionally slowly."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, name, size):
+        with self.lock:
+            self.calls.append((name, size))
+        time.sleep(self.delay)
+        return size, f"tokenizer of {name}"
+
+
+def make_registry(loader, memory_budget=0):
+    return ModelRegistry(loader, memory_budget, memory_estimator=lambda model: model)
+
+
+def test_hits_misses_and_lru_eviction():
+    loader = FakeLoader()
+    registry = make_registry(loader, memory_budget=100)
+
+    assert registry.get("a", 40) == (40, "tokenizer of a")
+    registry.get("b", 40)
+    registry.get("a", 40)
+    # a was used last, so b is evicted to make room for c
+    registry.get("c", 40)
+
+    assert ("a", 40) in registry and ("c", 40) in registry and ("b", 40) not in registry
+    assert registry.stats() == {"hits": 1, "misses": 3, "evictions": 1, "entries": 2, "memory": 80, "memory_budget": 100}
+
+
+def test_an_entry_larger_than_the_budget_is_kept_alone():
+    registry = make_registry(FakeLoader(), memory_budget=100)
+    registry.get("a", 40)
+    registry.get("big", 500)
+
+    assert len(registry) == 1 and ("big", 500) in registry
+    registry.set_memory_budget(0)
+    registry.get("a", 40)
+    assert len(registry) == 2
+
+
+def test_a_hit_is_not_blocked_by_a_load():
+    loader = FakeLoader()
+    registry = make_registry(loader)
+    registry.get("cached", 1)
+    loader.delay = 1.0
+    thread = threading.Thread(target=registry.get, args=("slow", 1))
+    thread.start()
+    time.sleep(0.1)
+
+    start = time.monotonic()
+    registry.get("cached", 1)
+    assert time.monotonic() - start < 0.5
+    thread.join()
+
+
+def test_concurrent_requests_load_once():
+    loader = FakeLoader(delay=0.3)
+    registry = make_registry(loader)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get("a", 1))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert loader.calls == [("a", 1)]
+    assert results == [(1, "tokenizer of a")] * 4
+    assert registry.stats()["misses"] == 1
+
+
+def test_a_failed_load_is_retried():
+    attempts = []
+
+    def loader(name):
+        attempts.append(name)
+        if len(attempts) == 1:
+            raise OSError("network down")
+        return 1, "tokenizer"
+
+    registry = make_registry(loader)
+    try:
+        registry.get("a")
+    except OSError:
+        pass
+    assert registry.get("a") == (1, "tokenizer")
+    assert attempts == ["a", "a"]
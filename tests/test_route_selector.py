@@ -0,0 +1,66 @@
+from route_selector import PeerInfo, RouteSelector, SimulatedPeerSource
+
+
+def make_source():
+    # Two ways through the 8 blocks: a and b (fast links), or c alone (a slow link), d can replace b
+    peers = [
+        PeerInfo("a", 0, 4, 100.0),
+        PeerInfo("b", 4, 8, 100.0),
+        PeerInfo("c", 0, 8, 100.0),
+        PeerInfo("d", 4, 8, 100.0),
+    ]
+    return SimulatedPeerSource(peers, {"a": 0.01, "b": 0.01, "c": 0.2, "d": 0.05}, seed=0)
+
+
+def test_picks_the_lowest_latency_route():
+    source = make_source()
+    selector = RouteSelector(source)
+
+    route = selector.select()
+
+    assert route.hops == [("a", 0, 4), ("b", 4, 8)]
+    assert source.applied_routes == [route]
+    assert selector.check() is False
+
+
+def test_reroutes_when_a_peer_degrades():
+    source = make_source()
+    selector = RouteSelector(source, smoothing=1.0)
+    selector.select()
+
+    source.set_latency("b", 0.5)
+
+    assert selector.check() is True
+    assert selector.route.peer_ids() == ["a", "d"]
+    assert source.applied_routes[-1] is selector.route
+    assert "went from 10 to 500 ms" in selector.decisions[-1][1]
+
+
+def test_reroutes_around_an_unreachable_peer():
+    source = make_source()
+    selector = RouteSelector(source)
+    selector.select()
+
+    source.set_latency("a", None)
+
+    assert selector.check() is True
+    assert selector.route.peer_ids() == ["c"]
+    assert "is unreachable" in selector.decisions[-1][1]
+
+
+def test_releases_the_route_when_no_route_covers_every_block():
+    source = make_source()
+    selector = RouteSelector(source)
+    selector.select()
+
+    for peer_id in ["b", "c", "d"]:
+        source.set_latency(peer_id, None)
+
+    assert selector.check() is False
+    assert selector.route is None
+    assert source.applied_routes[-1] is None
+
+    # Once a peer is back, the next check picks a route again
+    source.set_latency("c", 0.2)
+    assert selector.check() is True
+    assert selector.route.peer_ids() == ["c"]
@@ -0,0 +1,104 @@
+import os
+import select
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from server_launcher import command_line, launcher_message
+
+LAUNCHER = Path(__file__).resolve().parent.parent / "main_ui" / "server_launcher.py"
+
+STUB_RUN_SERVER = """
+import sys
+import time
+
+
+def main():
+    print("serving", sys.argv[1:], flush=True)
+    while True:
+        time.sleep(0.1)
+"""
+
+
+@pytest.fixture
+def launcher(tmp_path):
+    # Stand-ins for the modules the launcher imports, the server runs until it is signalled
+    for package in ["torch", "transformers", "petals", "petals/cli"]:
+        (tmp_path / package).mkdir()
+        (tmp_path / package / "__init__.py").write_text("")
+    (tmp_path / "petals" / "cli" / "run_server.py").write_text(STUB_RUN_SERVER)
+    env = dict(os.environ, PYTHONPATH=str(tmp_path))
+    process = subprocess.Popen(
+        [sys.executable, "-u", str(LAUNCHER), "--zygote"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        env=env,
+        # Unbuffered, so that select() sees every line that was not read yet
+        bufsize=0,
+    )
+    yield process
+    # Closing its input makes the launcher stop its server before exiting
+    process.stdin.close()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def read_markers(process, until, timeout=10):
+    """Read the launcher messages until one contains `until`, failing after `timeout` seconds."""
+    markers = []
+    deadline = time.monotonic() + timeout
+    while not markers or until not in markers[-1]:
+        remaining = deadline - time.monotonic()
+        readable, _, _ = select.select([process.stdout], [], [], max(remaining, 0))
+        assert readable, f"no {until!r} from the launcher, got {markers}"
+        line = process.stdout.readline().decode()
+        assert line, f"the launcher exited without {until!r}, got {markers}"
+        if launcher_message(line) is not None:
+            markers.append(launcher_message(line))
+    return markers
+
+
+def send(process, *commands):
+    process.stdin.write(b"".join(commands))
+    process.stdin.flush()
+
+
+def test_stop_right_after_start_stops_the_server(launcher):
+    # Both commands are buffered while the launcher imports, so they are handled back to back
+    send(launcher, command_line("start", ["model"]), command_line("stop"))
+
+    markers = read_markers(launcher, "exited")
+
+    assert markers[0].startswith("ready")
+    assert markers[1].startswith("started pid=")
+    assert markers[2].startswith("exited code=")
+    send(launcher, command_line("quit"))
+    assert launcher.wait(timeout=10) == 0
+
+
+def test_start_while_stopping_is_queued(launcher):
+    send(launcher, command_line("start", ["first"]))
+    read_markers(launcher, "started")
+
+    send(launcher, command_line("stop"), command_line("start", ["second"]))
+
+    markers = read_markers(launcher, "started")
+    assert markers[0].startswith("exited code=")
+    assert markers[1].startswith("started pid=")
+    send(launcher, command_line("stop"))
+    read_markers(launcher, "exited")
+    send(launcher, command_line("stop"))
+    assert read_markers(launcher, "error") == ["error no server is running"]
+
+
+def test_launcher_message_after_an_unfinished_line():
+    assert launcher_message("[launcher] started pid=12") == "started pid=12"
+    # A server killed while printing leaves its line unfinished
+    assert launcher_message("serving ['first'][launcher] exited code=-15") == "exited code=-15"
+    assert launcher_message("serving ['first']") is None